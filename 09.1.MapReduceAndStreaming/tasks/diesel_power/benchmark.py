@@ -0,0 +1,219 @@
+"""
+Throughput and memory benchmark of diesel_power operations on synthetic tables.
+
+Every Mapper, Reducer and Joiner is run over generated rows which are produced lazily, so that only
+memory held by the operation itself shows up. Memory is reported as peak RSS growth and as peak memory
+traced by tracemalloc per input row. CPython exposes no count of allocations, so memory which is allocated
+and freed row by row does not show up in either. Usage:
+
+    python -m diesel_power.benchmark --rows 1000000 10000000 --only Join
+"""
+import argparse
+import dataclasses
+import random
+import string
+import sys
+import time
+import tracemalloc
+import typing as tp
+from collections import deque
+
+from . import operations as ops
+from .memory_watchdog import SELF_PROCESS, MemoryWatchdog
+
+SEED = 42
+GROUP_SIZE = 100  # rows per key of sorted tables
+SKEW = 1.2  # exponent of Zipf-like distribution of skewed keys
+HOT_KEY_ROWS = 1000  # rows with the hot key, self-join of them yields HOT_KEY_ROWS ** 2 rows
+WORDS = [''.join(random.Random(i).choices(string.ascii_letters, k=3 + i % 8)) for i in range(10000)]
+
+
+def text_rows(n: int, seed: int = SEED) -> ops.TRowsGenerator:
+    """Documents sorted by doc_id with a few sentences of random words and punctuation"""
+    rng = random.Random(seed)
+    for i in range(n):
+        words = rng.choices(WORDS, k=12)
+        yield {'doc_id': i // GROUP_SIZE, 'text': ', '.join(words[:6]) + '. ' + ' '.join(words[6:]) + '!'}
+
+
+def numeric_rows(n: int, seed: int = SEED) -> ops.TRowsGenerator:
+    """Rows sorted by key with uniformly distributed numeric columns"""
+    rng = random.Random(seed)
+    for i in range(n):
+        yield {'key': i // GROUP_SIZE, 'a': rng.randrange(1000), 'b': rng.random(), 'word': rng.choice(WORDS)}
+
+
+def dimension_rows(n: int, seed: int = SEED) -> ops.TRowsGenerator:
+    """One row per key of a numeric table of n rows, to join it with without multiplying rows"""
+    rng = random.Random(seed)
+    for key in range((n + GROUP_SIZE - 1) // GROUP_SIZE):
+        yield {'key': key, 'a': rng.randrange(1000), 'name': rng.choice(WORDS)}
+
+
+def skewed_rows(n: int, seed: int = SEED) -> ops.TRowsGenerator:
+    """
+    Rows sorted by key where group sizes follow Zipf-like distribution: the first key holds
+    a noticeable share of the table, which stresses joiners and reducers buffering a whole group
+    """
+    rng = random.Random(seed)
+    key = produced = 0
+    while produced < n:
+        size = min(n - produced, max(1, int(n * 0.1 / (key + 1) ** SKEW)))
+        for _ in range(size):
+            yield {'key': key, 'a': rng.randrange(1000), 'b': rng.random(), 'word': rng.choice(WORDS)}
+        produced += size
+        key += 1
+
+
+def hot_key_rows(n: int, seed: int = SEED) -> ops.TRowsGenerator:
+    """Rows sorted by key where one key has HOT_KEY_ROWS rows and all others are unique, for self-joins"""
+    rng = random.Random(seed)
+    hot = min(HOT_KEY_ROWS, n)
+    for i in range(n):
+        yield {'key': max(0, i - hot + 1), 'a': rng.randrange(1000), 'word': rng.choice(WORDS)}
+
+
+@dataclasses.dataclass
+class Case:
+    name: str
+    operation: tp.Callable[[], ops.Operation]
+    tables: tuple[tp.Callable[[int], ops.TRowsIterable], ...]
+
+
+def _join(joiner: ops.Joiner) -> tp.Callable[[], ops.Operation]:
+    return lambda: ops.Join(joiner, ['key'])
+
+
+CASES = [
+    Case('DummyMapper', lambda: ops.Map(ops.DummyMapper()), (numeric_rows,)),
+    Case('FilterPunctuation', lambda: ops.Map(ops.FilterPunctuation('text')), (text_rows,)),
+    Case('LowerCase', lambda: ops.Map(ops.LowerCase('text')), (text_rows,)),
+    Case('Split', lambda: ops.Map(ops.Split('text')), (text_rows,)),
+    Case('Product', lambda: ops.Map(ops.Product(['a', 'b'], 'product')), (numeric_rows,)),
+    Case('Filter', lambda: ops.Map(ops.Filter(lambda row: row['a'] < 500)), (numeric_rows,)),
+    Case('Project', lambda: ops.Map(ops.Project(['key', 'a'])), (numeric_rows,)),
+    Case('FirstReducer', lambda: ops.Reduce(ops.FirstReducer(), ['key']), (numeric_rows,)),
+    Case('TopN', lambda: ops.Reduce(ops.TopN('a', 3), ['key']), (numeric_rows,)),
+    Case('TermFrequency', lambda: ops.Reduce(ops.TermFrequency('word'), ['key']), (numeric_rows,)),
+    Case('Count', lambda: ops.Reduce(ops.Count('count'), ['key']), (numeric_rows,)),
+    Case('Sum', lambda: ops.Reduce(ops.Sum('a'), ['key']), (numeric_rows,)),
+    Case('ApproxDistinctCount', lambda: ops.Reduce(ops.ApproxDistinctCount('word'), ['key']), (numeric_rows,)),
+    Case('HeavyHitters', lambda: ops.Reduce(ops.HeavyHitters('word', 3), ['key']), (numeric_rows,)),
+    Case('ApproxQuantiles', lambda: ops.Reduce(ops.ApproxQuantiles('b', {'median': 0.5}), ['key']),
+         (numeric_rows,)),
+    Case('TopN (skewed)', lambda: ops.Reduce(ops.TopN('a', 3), ['key']), (skewed_rows,)),
+    Case('InnerJoiner', _join(ops.InnerJoiner()), (numeric_rows, dimension_rows)),
+    Case('OuterJoiner', _join(ops.OuterJoiner()), (numeric_rows, dimension_rows)),
+    Case('LeftJoiner', _join(ops.LeftJoiner()), (numeric_rows, dimension_rows)),
+    Case('RightJoiner', _join(ops.RightJoiner()), (numeric_rows, dimension_rows)),
+    Case('InnerJoiner (skewed)', _join(ops.InnerJoiner()), (skewed_rows, dimension_rows)),
+    Case('InnerJoiner (hot key)', _join(ops.InnerJoiner()), (hot_key_rows, hot_key_rows)),
+    Case('LeftJoiner (hot key)', _join(ops.LeftJoiner()), (hot_key_rows, hot_key_rows)),
+]
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    rows_in: int
+    rows_out: int
+    seconds: float
+    peak_rss_delta: int
+    peak_traced_bytes_per_row: float  # peak of memory live at once, not allocated in total
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_in / self.seconds if self.seconds else float('inf')
+
+
+class _Counted:
+    def __init__(self, rows: ops.TRowsIterable) -> None:
+        self._rows = iter(rows)
+        self.count = 0
+
+    def __iter__(self) -> '_Counted':
+        return self
+
+    def __next__(self) -> ops.TRow:
+        row = next(self._rows)
+        self.count += 1
+        return row
+
+
+def _run(case: Case, rows: int) -> tuple[int, int]:
+    """Drain operation over freshly generated tables and return numbers of input and output rows"""
+    tables = [_Counted(table(rows)) for table in case.tables]
+    counter = iter(range(1, sys.maxsize))
+    deque(zip(case.operation()(*tables), counter), maxlen=0)
+    return sum(table.count for table in tables), next(counter) - 1
+
+
+def run_case(case: Case, rows: int, trace_rows: int) -> Result:
+    """
+    :param case: case to run
+    :param rows: rows in the main input table
+    :param trace_rows: rows in the main input table of a separate run under tracemalloc, which is too slow
+                       for full size. Peak traced memory per input row stays near zero for streaming operations
+                       and shows buffering of whole groups or tables otherwise
+    """
+    watchdog = MemoryWatchdog(limit=1 << 40, is_baseline=True)
+    start_rss = SELF_PROCESS.memory_info().rss
+    watchdog.start()
+    start = time.perf_counter()
+    try:
+        rows_in, rows_out = _run(case, rows)
+    finally:
+        seconds = time.perf_counter() - start
+        watchdog.stop()
+        watchdog.join()
+    peak_rss = max(watchdog.maximum_memory_usage, SELF_PROCESS.memory_info().rss)
+
+    trace_rows = min(rows, trace_rows)
+    tracemalloc.start()
+    try:
+        trace_rows_in, _ = _run(case, trace_rows)
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        name=case.name,
+        rows_in=rows_in,
+        rows_out=rows_out,
+        seconds=seconds,
+        peak_rss_delta=max(0, peak_rss - start_rss),
+        peak_traced_bytes_per_row=traced_peak / max(1, trace_rows_in),
+    )
+
+
+def format_results(results: tp.Iterable[Result]) -> str:
+    lines = [f'{"case":<24}{"rows in":>12}{"rows out":>12}{"seconds":>10}{"rows/s":>12}'
+             f'{"peak RSS, KiB":>15}{"peak traced B/row":>19}']
+    for result in results:
+        lines.append(f'{result.name:<24}{result.rows_in:>12}{result.rows_out:>12}{result.seconds:>10.2f}'
+                     f'{result.rows_per_second:>12.0f}{result.peak_rss_delta // 1024:>15}'
+                     f'{result.peak_traced_bytes_per_row:>19.1f}')
+    return '\n'.join(lines)
+
+
+def main(argv: tp.Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000],
+                        help='sizes of the main input table')
+    parser.add_argument('--trace-rows', type=int, default=100_000,
+                        help='size of the main input table for tracemalloc run')
+    parser.add_argument('--only', nargs='*', default=[], help='run cases whose names contain any of substrings')
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES if not args.only or any(part in case.name for part in args.only)]
+    for rows in args.rows:
+        results = []
+        for case in cases:
+            results.append(run_case(case, rows, args.trace_rows))
+            print(format_results(results[-1:]).splitlines()[-1], file=sys.stderr)
+        print(f'\n{rows} rows per table, seed {SEED}')
+        print(format_results(results))
+
+
+if __name__ == '__main__':
+    main()
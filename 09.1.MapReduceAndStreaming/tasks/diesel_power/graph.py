@@ -0,0 +1,163 @@
+import typing as tp
+
+from . import operations as ops
+from .memory_watchdog import MemoryWatchdog
+from .profiling import Instrumented, PipelineReport, describe
+
+TStage = tuple[ops.Operation, tuple['Graph', ...]]
+
+
+class Graph:
+    """
+    Computational graph over tables. Operations are only recorded by builder methods,
+    the graph is optimized and executed by `run`
+    """
+
+    def __init__(self, source: ops.Operation, stages: tuple[TStage, ...] = ()) -> None:
+        """
+        :param source: operation producing rows of the table
+        :param stages: operations applied to the table one by one with graphs producing their extra inputs
+        """
+        self._source = source
+        self._stages = stages
+
+    @staticmethod
+    def from_iter(name: str) -> 'Graph':
+        """Construct new graph which reads rows from a factory passed to `run` as keyword argument `name`
+        :param name: name of kwarg to use as data source
+        """
+        return Graph(ops.ReadIterFactory(name))
+
+    @staticmethod
+    def from_file(filename: str, parser: tp.Callable[[str], ops.TRow]) -> 'Graph':
+        """Construct new graph extended with operation for reading rows from file
+        :param filename: filename to read from
+        :param parser: parser from string to row
+        """
+        return Graph(ops.Read(filename, parser))
+
+    def _then(self, operation: ops.Operation, *inputs: 'Graph') -> 'Graph':
+        return Graph(self._source, self._stages + ((operation, inputs),))
+
+    def map(self, mapper: ops.Mapper) -> 'Graph':
+        """Construct new graph extended with map operation with particular mapper
+        :param mapper: mapper to use
+        """
+        return self._then(ops.Map(mapper))
+
+    def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
+        """Construct new graph extended with reduce operation with particular reducer
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        """
+        return self._then(ops.Reduce(reducer, keys))
+
+    def combine(self, combiner: ops.Combiner, keys: tp.Sequence[str],
+                max_groups: int = ops.COMBINE_MAX_GROUPS) -> 'Graph':
+        """Construct new graph extended with partial aggregation of unsorted rows
+        :param combiner: combiner to use
+        :param keys: keys for grouping
+        :param max_groups: number of partial aggregates to keep in memory
+        """
+        return self._then(ops.Combine(combiner, keys, max_groups))
+
+    def sort(self, keys: tp.Sequence[str]) -> 'Graph':
+        """Construct new graph extended with sort operation
+        :param keys: sorting keys (typical is tuple of strings)
+        """
+        return self._then(ops.Sort(keys))
+
+    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str]) -> 'Graph':
+        """Construct new graph extended with join operation with another graph
+        :param joiner: join strategy to use
+        :param join_graph: other graph to join with
+        :param keys: keys for grouping
+        """
+        return self._then(ops.Join(joiner, keys), join_graph)
+
+    def plan(self) -> list[ops.Operation]:
+        """Operations which are actually executed by `run` after optimization, source excluded"""
+        return [operation for operation, _ in _fuse_maps(_push_down_filters(self._stages))]
+
+    def run(self, report: PipelineReport | None = None, watchdog: MemoryWatchdog | None = None,
+            **kwargs: tp.Any) -> ops.TRowsIterable:
+        """Single method to start execution; data sources passed as kwargs
+        :param report: if passed, every operation is instrumented and its statistics are added to report
+        :param watchdog: if passed, operations and joiners buffering rows are registered to release memory
+                         when the watchdog reports memory pressure, until the returned rows are exhausted or closed
+        """
+        source: ops.Operation = self._source
+        if report is not None:
+            source = Instrumented(source, report.add(describe(source)))
+        rows = source(**kwargs)
+        spillables: list[ops.Spillable] = []
+        for operation, inputs in _fuse_maps(_push_down_filters(self._stages)):
+            spillables.extend(spillable for spillable in (operation, getattr(operation, 'joiner', None))
+                              if isinstance(spillable, ops.Spillable))
+            if report is not None:
+                operation = Instrumented(operation, report.add(describe(operation)))
+            rows = operation(rows, *(graph.run(report, watchdog, **kwargs) for graph in inputs), **kwargs)
+        if watchdog is not None and spillables:
+            return _registered(rows, watchdog, spillables)
+        return rows
+
+
+def _registered(rows: ops.TRowsIterable, watchdog: MemoryWatchdog,
+                spillables: tp.Sequence[ops.Spillable]) -> ops.TRowsGenerator:
+    """Yield rows while spillables are registered in watchdog, unregister them once rows are exhausted or closed"""
+    for spillable in spillables:
+        # Request left by a previous run of the same graph would make this run spill at once
+        spillable.clear_memory_pressure()
+        watchdog.register(spillable.on_memory_pressure)
+    try:
+        yield from rows
+    finally:
+        for spillable in spillables:
+            watchdog.unregister(spillable.on_memory_pressure)
+
+
+def _commutes_with_sort(operation: ops.Operation, sort: ops.Sort) -> bool:
+    """Filtering and projecting which keeps sorting keys give the same rows in the same order before sort"""
+    if not isinstance(operation, ops.Map):
+        return False
+    if isinstance(operation.mapper, ops.Filter):
+        return True
+    if isinstance(operation.mapper, ops.Project):
+        return set(sort.keys) <= set(operation.mapper.columns)
+    return False
+
+
+def _push_down_filters(stages: tp.Sequence[TStage]) -> list[TStage]:
+    """Move filters and projections in front of sorts, so that fewer rows and columns are sorted"""
+    result = list(stages)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(1, len(result)):
+            previous, current = result[i - 1][0], result[i][0]
+            if isinstance(previous, ops.Sort) and _commutes_with_sort(current, previous):
+                result[i - 1], result[i] = result[i], result[i - 1]
+                changed = True
+    return result
+
+
+def _fuse_maps(stages: tp.Sequence[TStage]) -> list[TStage]:
+    """Replace runs of adjacent map operations with a single fused map"""
+    result: list[TStage] = []
+    mappers: list[ops.Mapper] = []
+
+    def flush() -> None:
+        if len(mappers) == 1:
+            result.append((ops.Map(mappers[0]), ()))
+        elif mappers:
+            result.append((ops.FusedMap(list(mappers)), ()))
+        mappers.clear()
+
+    for operation, inputs in stages:
+        if isinstance(operation, ops.Map):
+            mappers.append(operation.mapper)
+            continue
+        flush()
+        result.append((operation, inputs))
+    flush()
+    return result
@@ -1,29 +1,69 @@
+import dataclasses
+import tracemalloc
+import typing as tp
+from array import array
 from os import environ, getpid
 from sys import stderr
-from threading import Thread, Event
-from time import sleep
+from threading import Thread, Event, Lock
+from time import perf_counter
 
 from psutil import Process
 
 VERBOSE = int(environ.get("VERBOSE", "0"))
 SLEEP_PERIOD = float(environ.get("WATCHDOG_PERIOD", "100")) / 1000.0  # in msec
 WIDTH = int(environ.get("PLOT_WIDTH", "100")) // 5 * 5
+HISTORY_SIZE = int(environ.get("WATCHDOG_HISTORY", "4096"))  # samples kept in ring buffer
+TOP_ALLOCATIONS = 10  # allocation sites kept per tracemalloc snapshot
 SELF_PROCESS = Process(getpid())
 
 
+@dataclasses.dataclass
+class MemorySpike:
+    """Top allocation sites captured when memory usage first crossed `threshold` fraction of limit"""
+
+    threshold: float
+    usage: int
+    time: float  # seconds since watchdog start
+    top: list[tuple[str, int]]  # (file:line, bytes)
+
+
 class MemoryWatchdog(Thread):
     """
     This class implements thread watching for current process memory consumption.
     Watchdog may be configured using the environment variables above.
+    Last HISTORY_SIZE samples are kept in preallocated arrays, so sampling allocates nothing.
+    While usage is above the soft limit, registered callbacks are called on every sample, so that pipeline
+    stages spill or flush buffered rows before the process runs out of memory.
     """
 
-    def __init__(self, limit: int, is_baseline: bool = False) -> None:
+    def __init__(self, limit: int, is_baseline: bool = False, history_size: int = HISTORY_SIZE,
+                 snapshot_thresholds: tp.Sequence[float] = (), soft_limit: float | None = None) -> None:
+        """
+        :param limit: memory limit in bytes
+        :param is_baseline: do not print maximum usage on stop
+        :param history_size: number of last (time, rss) samples to keep
+        :param snapshot_thresholds: fractions of limit crossing which captures tracemalloc top allocation sites;
+                                    tracemalloc is started for the watchdog lifetime if not tracing yet
+        :param soft_limit: fraction of limit above which registered callbacks are called, None to never call them
+        """
         self._stop_event = Event()
         self.maximum_memory_usage = 0
         self.limit = limit
         self.limit_in_kib = limit // 1024
         self._is_baseline = is_baseline
 
+        self._times = array("d", [0.]) * history_size
+        self._usages = array("Q", [0]) * history_size
+        self._samples_count = 0
+        self._thresholds = sorted(snapshot_thresholds)
+        self._started_tracing = False
+        self._start_time = 0.
+        self.spikes: list[MemorySpike] = []
+        self.soft_limit = soft_limit
+        self.pressure_signals = 0
+        self._callbacks: list[tp.Callable[[], None]] = []
+        self._callbacks_lock = Lock()
+
         if VERBOSE:
             # To not interfere with pytest output.
             print("", file=stderr)
@@ -38,6 +78,47 @@ class MemoryWatchdog(Thread):
 
         super().__init__()
 
+    def start(self) -> None:
+        if self._thresholds and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start_time = perf_counter()
+        super().start()
+
+    def _record(self, usage: int) -> None:
+        i = self._samples_count % len(self._usages)
+        self._times[i] = perf_counter() - self._start_time
+        self._usages[i] = usage
+        self._samples_count += 1
+
+    def _capture(self, usage: int) -> None:
+        while self._thresholds and usage >= self._thresholds[0] * self.limit:
+            threshold = self._thresholds.pop(0)
+            top = []
+            if tracemalloc.is_tracing():
+                for stat in tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]:
+                    frame = stat.traceback[0]
+                    top.append((f"{frame.filename}:{frame.lineno}", stat.size))
+            self.spikes.append(MemorySpike(threshold, usage, perf_counter() - self._start_time, top))
+
+    def register(self, callback: tp.Callable[[], None]) -> None:
+        """Call callback from watchdog thread while usage is above soft limit (e.g. Spillable.on_memory_pressure)"""
+        with self._callbacks_lock:
+            self._callbacks.append(callback)
+
+    def unregister(self, callback: tp.Callable[[], None]) -> None:
+        with self._callbacks_lock:
+            self._callbacks.remove(callback)
+
+    def _signal_pressure(self, usage: int) -> None:
+        if self.soft_limit is None or usage < self.soft_limit * self.limit:
+            return
+        with self._callbacks_lock:
+            callbacks = list(self._callbacks)
+        self.pressure_signals += 1
+        for callback in callbacks:
+            callback()
+
     def run(self) -> None:
         while True:
             if self._stop_event.is_set():
@@ -45,6 +126,10 @@ class MemoryWatchdog(Thread):
             usage = SELF_PROCESS.memory_info().rss
             usage_in_kib = usage // 1024
             self.maximum_memory_usage = max(self.maximum_memory_usage, usage)
+            if self._usages:
+                self._record(usage)
+            self._capture(usage)
+            self._signal_pressure(usage)
 
             if VERBOSE:
                 line = str(usage_in_kib).ljust(9) + "|" + "=" * min(WIDTH, usage * WIDTH // self.limit)
@@ -52,11 +137,31 @@ class MemoryWatchdog(Thread):
                     line += min(10, (usage - self.limit) * WIDTH // self.limit) * "X"
                 print(line, file=stderr)
 
-            sleep(SLEEP_PERIOD)
+            self._stop_event.wait(SLEEP_PERIOD)
 
+        if self._started_tracing:
+            tracemalloc.stop()
         if not self._is_baseline:
             print("Maximum memory usage / limit (in KiB):",
                   self.maximum_memory_usage // 1024, "/", self.limit // 1024, file=stderr)
 
     def stop(self) -> None:
         self._stop_event.set()
+
+    def samples(self) -> list[tuple[float, int]]:
+        """Kept (seconds since start, rss) samples, oldest first"""
+        size = len(self._usages)
+        first = max(0, self._samples_count - size)
+        return [(self._times[i % size], self._usages[i % size]) for i in range(first, self._samples_count)]
+
+    def report(self) -> dict[str, tp.Any]:
+        """JSON serializable summary of the run with memory time series and captured spikes"""
+        return {
+            "limit": self.limit,
+            "maximum_memory_usage": self.maximum_memory_usage,
+            "period": SLEEP_PERIOD,
+            "samples_count": self._samples_count,
+            "samples": self.samples(),
+            "spikes": [dataclasses.asdict(spike) for spike in self.spikes],
+            "pressure_signals": self.pressure_signals,
+        }
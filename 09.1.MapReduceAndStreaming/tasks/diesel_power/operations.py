@@ -1,13 +1,41 @@
+import asyncio
+import bz2
+import contextlib
+import gzip
+import hashlib
 import heapq
+import lzma
+import math
+import mmap
+import operator
+import os
+import pickle
+import re
 import string
+import struct
+import tempfile
+import threading
+from pathlib import Path
 from abc import abstractmethod, ABC
 import typing as tp
-from collections import defaultdict
-from itertools import groupby
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import chain, groupby, islice, repeat, takewhile
 
 TRow = dict[str, tp.Any]
 TRowsIterable = tp.Iterable[TRow]
 TRowsGenerator = tp.Generator[TRow, None, None]
+TRecord = tuple[tp.Any, ...]
+TRecordsIterable = tp.Iterable[TRecord]
+TRecordsGenerator = tp.Generator[TRecord, None, None]
+# Result column names and getters of values for them from left and right rows
+TJoinMapping = tuple[tuple[str, ...], tp.Callable[[TRow], TRecord], tp.Callable[[TRow], TRecord]]
+# Columns of left and right rows the mapping was made for and the mapping
+TJoinPlan = tuple[frozenset[str], frozenset[str], TJoinMapping]
+
+JOIN_MAX_ROWS_IN_MEMORY = 65536
+COMBINE_MAX_GROUPS = 65536
+SPILL_CHUNK_SIZE = 1024
 
 
 class Operation(ABC):
@@ -16,6 +44,31 @@ class Operation(ABC):
         pass
 
 
+class Spillable:
+    """
+    Base class for objects buffering rows, which release memory on request (e.g. of MemoryWatchdog):
+    buffered rows are spilled to disk or flushed downstream as soon as possible
+    """
+
+    def __init__(self) -> None:
+        self._memory_pressure = threading.Event()
+
+    def on_memory_pressure(self) -> None:
+        """Request to release memory, safe to call from any thread"""
+        self._memory_pressure.set()
+
+    def clear_memory_pressure(self) -> None:
+        """Drop pending request to release memory, e.g. left by a previous run"""
+        self._memory_pressure.clear()
+
+    def _take_memory_pressure(self) -> bool:
+        """Check and reset pending request to release memory"""
+        if self._memory_pressure.is_set():
+            self._memory_pressure.clear()
+            return True
+        return False
+
+
 class Read(Operation):
     def __init__(self, filename: str, parser: tp.Callable[[str], TRow]) -> None:
         self.filename = filename
@@ -36,6 +89,165 @@ class ReadIterFactory(Operation):
             yield row
 
 
+_OPENERS: dict[str, tp.Callable[..., tp.TextIO]] = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+def _open_text(filename: str) -> tp.TextIO:
+    """Open text file, decompressing it according to its extension"""
+    return _OPENERS.get(os.path.splitext(filename)[1], open)(filename, 'rt')
+
+
+def _close_opened(opened: 'Future[tp.TextIO]') -> None:
+    """Close file of finished _open_text future unless opening failed or was cancelled"""
+    if not opened.cancelled() and opened.exception() is None:
+        opened.result().close()
+
+
+class AsyncRead(Operation):
+    """
+    Read several (possibly compressed) files concurrently. Every file is read and parsed by batches in its own
+    thread driven by asyncio, so decompression of shards overlaps with each other and with processing of rows
+    by following operations. Rows of one file keep their order, rows of different files are interleaved
+    """
+
+    def __init__(self, filenames: tp.Sequence[str], parser: tp.Callable[[str], TRow], batch_size: int = 1024,
+                 max_batches_in_flight: int = 16, max_files_in_flight: int = 8) -> None:
+        """
+        :param filenames: files to read, .gz, .bz2 and .xz are decompressed
+        :param parser: parser from string to row
+        :param batch_size: number of lines read and parsed at once
+        :param max_batches_in_flight: number of batches read ahead, bounds memory
+        :param max_files_in_flight: number of files read simultaneously
+        """
+        self.filenames = filenames
+        self.parser = parser
+        self.batch_size = batch_size
+        self.max_batches_in_flight = max_batches_in_flight
+        self.max_files_in_flight = max_files_in_flight
+
+    def _read_batch(self, f: tp.TextIO) -> list[TRow]:
+        return [self.parser(line) for line in islice(f, self.batch_size)]
+
+    async def _read_file(self, filename: str, queue: 'asyncio.Queue[list[TRow] | BaseException | None]',
+                         semaphore: asyncio.Semaphore) -> None:
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            # Single thread per file: close is executed only after a read interrupted by cancellation
+            # and after an open whose awaiting was cancelled, so the file opened in the thread does not leak
+            executor = ThreadPoolExecutor(max_workers=1)
+            opened = executor.submit(_open_text, filename)
+            try:
+                f = await asyncio.wrap_future(opened)
+                while batch := await loop.run_in_executor(executor, self._read_batch, f):
+                    await queue.put(batch)
+            except Exception as error:
+                await queue.put(error)
+                return
+            finally:
+                executor.submit(_close_opened, opened)
+                executor.shutdown(wait=False)
+        await queue.put(None)
+
+    async def batches(self) -> tp.AsyncGenerator[list[TRow], None]:
+        """Asynchronous interface: batches of rows in order of readiness"""
+        queue: asyncio.Queue[list[TRow] | BaseException | None] = asyncio.Queue(self.max_batches_in_flight)
+        semaphore = asyncio.Semaphore(self.max_files_in_flight)
+        readers = [asyncio.create_task(self._read_file(filename, queue, semaphore)) for filename in self.filenames]
+        try:
+            remaining = len(readers)
+            while remaining:
+                batch = await queue.get()
+                if batch is None:
+                    remaining -= 1
+                elif isinstance(batch, BaseException):
+                    raise batch
+                else:
+                    yield batch
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        # Event loop runs in a separate thread, so files are read while rows are processed here
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        batches = self.batches()
+        try:
+            while True:
+                try:
+                    batch = asyncio.run_coroutine_threadsafe(batches.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+                yield from batch
+        finally:
+            asyncio.run_coroutine_threadsafe(batches.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+BINARY_MAGIC = b'DPROWS\x01\n'
+_FRAME_HEADER = struct.Struct('<I')
+
+
+def _write_frame(f: tp.BinaryIO, batch: list[TRow]) -> None:
+    data = pickle.dumps(batch, protocol=5)
+    f.write(_FRAME_HEADER.pack(len(data)))
+    f.write(data)
+
+
+class WriteBinary(Operation):
+    """
+    Write rows to file readable by ReadBinary and pass them through unchanged.
+    File is a magic header followed by frames: 4-byte little-endian length and pickled batch of rows
+    """
+
+    def __init__(self, filename: str, batch_size: int = 1024) -> None:
+        """
+        :param filename: file to write to
+        :param batch_size: number of rows in one frame
+        """
+        self.filename = filename
+        self.batch_size = batch_size
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        rows = iter(rows)
+        with open(self.filename, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            # Batch is written before it is passed further, so that following operations may modify rows
+            while batch := list(islice(rows, self.batch_size)):
+                _write_frame(f, batch)
+                yield from batch
+
+
+class ReadBinary(Operation):
+    """Read rows written by WriteBinary with a sequential scan over memory-mapped file"""
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        with open(self.filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+                raise ValueError(f'{self.filename} is not a binary rows file')
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+            offset = len(BINARY_MAGIC)
+            view = memoryview(mapped)
+            try:
+                while offset < len(mapped):
+                    (size,) = _FRAME_HEADER.unpack_from(mapped, offset)
+                    offset += _FRAME_HEADER.size
+                    batch = pickle.loads(view[offset:offset + size])
+                    offset += size
+                    yield from batch
+            finally:
+                view.release()
+
+
 # Operations
 
 
@@ -59,6 +271,81 @@ class Map(Operation):
             yield from self.mapper(row)
 
 
+class FusedMap(Operation):
+    """
+    Chain of Map operations: rows produced by one mapper are passed to the next one by C-level iterators
+    without a Python generator stage in between. Rows stream one at a time, so a mapper producing many rows
+    from one (e.g. Split) is never materialized
+    """
+
+    def __init__(self, mappers: tp.Sequence[Mapper]) -> None:
+        self.mappers = mappers
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        for mapper in self.mappers:
+            rows = chain.from_iterable(map(mapper, rows))
+        yield from rows
+
+
+_worker_mapper: Mapper | None = None
+
+
+def _init_map_worker(mapper: Mapper) -> None:
+    global _worker_mapper
+    _worker_mapper = mapper
+
+
+def _map_chunk(chunk: list[TRow]) -> list[TRow]:
+    assert _worker_mapper is not None
+    return [result for row in chunk for result in _worker_mapper(row)]
+
+
+class ParallelMap(Operation):
+    """
+    Map which applies mapper to chunks of rows in a pool of processes.
+    Number of chunks in flight is bounded, so memory does not depend on table size.
+    Mapper, rows and results must be picklable
+    """
+
+    def __init__(self, mapper: Mapper, workers: int | None = None, chunk_size: int = 1024,
+                 ordered: bool = True, max_chunks_in_flight: int | None = None) -> None:
+        """
+        :param mapper: mapper to apply
+        :param workers: number of worker processes, number of CPUs by default
+        :param chunk_size: number of rows sent to a worker at once
+        :param ordered: keep order of input rows, otherwise chunks are yielded as soon as they are ready
+        :param max_chunks_in_flight: number of chunks submitted but not yielded yet, twice the workers by default
+        """
+        self.mapper = mapper
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+        self.max_chunks_in_flight = max_chunks_in_flight or 2 * self.workers
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        rows = iter(rows)
+        executor = ProcessPoolExecutor(self.workers, initializer=_init_map_worker, initargs=(self.mapper,))
+        in_flight: deque[Future[list[TRow]]] = deque()
+        try:
+            while chunk := list(islice(rows, self.chunk_size)):
+                in_flight.append(executor.submit(_map_chunk, chunk))
+                if len(in_flight) >= self.max_chunks_in_flight:
+                    yield from self._pop_ready(in_flight)
+            while in_flight:
+                yield from self._pop_ready(in_flight)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _pop_ready(self, in_flight: deque[Future[list[TRow]]]) -> TRowsGenerator:
+        if self.ordered:
+            yield from in_flight.popleft().result()
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            in_flight.remove(future)
+            yield from future.result()
+
+
 class Reducer(ABC):
     """Base class for reducers"""
 
@@ -76,26 +363,368 @@ class Reduce(Operation):
         self.keys = keys
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        for _, grouped_rows in groupby(rows, key=lambda row: row[self.keys[0]]):
+        for _, grouped_rows in groupby(rows, key=_columns_getter(self.keys)):
             yield from self.reducer(tuple(self.keys), grouped_rows)
 
 
-def _left_join(rows_a: tp.Iterable[dict[str, tp.Any]], rows_b: tp.Sequence[dict[str, tp.Any]]) -> TRowsGenerator:
+class Combiner(ABC):
+    """Base class for combiners: associative partial aggregation of rows with equal keys"""
+
+    @abstractmethod
+    def __call__(self, group_key: tuple[str, ...], partial: TRow | None, row: TRow) -> TRow:
+        """
+        :param group_key: names of key columns
+        :param partial: partial aggregate for the key, None for the first row with the key
+        :param row: next row with the key
+        :return: updated partial aggregate
+        """
+        pass
+
+
+class Combine(Operation, Spillable):
+    """
+    Pre-aggregation of unsorted rows before sort and reduce. At most `max_groups` partial aggregates
+    are kept in memory, all of them are flushed when the limit is hit or on memory pressure. So output may
+    contain several rows per key and still has to be reduced (e.g. CountCombiner and SumCombiner are
+    finished with Sum)
+    """
+
+    def __init__(self, combiner: Combiner, keys: tp.Sequence[str], max_groups: int = COMBINE_MAX_GROUPS) -> None:
+        """
+        :param combiner: combiner to use
+        :param keys: keys for grouping
+        :param max_groups: number of partial aggregates to keep in memory
+        """
+        super().__init__()
+        self.combiner = combiner
+        self.keys = keys
+        self.max_groups = max_groups
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        keys = tuple(self.keys)
+        key = _columns_getter(keys)
+        partials: dict[tuple[tp.Any, ...], TRow] = {}
+        for row in rows:
+            row_key = key(row)
+            partials[row_key] = self.combiner(keys, partials.get(row_key), row)
+            if len(partials) >= self.max_groups or self._take_memory_pressure():
+                yield from partials.values()
+                partials = {}
+        yield from partials.values()
+
+
+class SlidingWindow(Operation):
+    """
+    Reduce time-ordered table by windows [start, start + size) with starts at multiples of step.
+    Only rows of open windows are buffered, results of a window are yielded as soon as a row
+    after its end arrives. Windows without rows are skipped, rows between windows (step > size) are dropped
+    """
+
+    def __init__(self, reducer: Reducer, time_column: str, size: float, step: float, keys: tp.Sequence[str] = (),
+                 start_column: str = 'window_start', end_column: str = 'window_end') -> None:
+        """
+        :param reducer: reducer to apply to rows of a window
+        :param time_column: name of numeric column rows are ordered by
+        :param size: length of window
+        :param step: distance between starts of consecutive windows
+        :param keys: keys for grouping inside window, reducer gets all rows of the window if empty
+        :param start_column: name for result column with window start
+        :param end_column: name for result column with window end
+        """
+        self.reducer = reducer
+        self.time_column = time_column
+        self.size = size
+        self.step = step
+        self.keys = keys
+        self.start_column = start_column
+        self.end_column = end_column
+        # If size is a multiple of step, ends of windows are computed exactly as starts of later windows
+        steps = size / step
+        self._size_in_steps = int(steps) if steps == int(steps) else None
+
+    def _bounds(self, window: int) -> tuple[float, float]:
+        """Start and end of the window by its index, computed from the index to not accumulate float error"""
+        if self._size_in_steps is not None:
+            return window * self.step, (window + self._size_in_steps) * self.step
+        return window * self.step, window * self.step + self.size
+
+    def _windows(self, time: float) -> tuple[int, int]:
+        """Indices of the first and the last windows containing time, the first is greater for time in a gap"""
+        first = math.floor((time - self.size) / self.step) + 1
+        last = math.floor(time / self.step)
+        # Division is rounded differently from bounds, so estimates are corrected by comparison with bounds
+        while self._bounds(first)[1] <= time:
+            first += 1
+        while self._bounds(first - 1)[1] > time:
+            first -= 1
+        while self._bounds(last)[0] > time:
+            last -= 1
+        while self._bounds(last + 1)[0] <= time:
+            last += 1
+        return first, last
+
+    def _reduce_window(self, rows: tp.Iterable[TRow], window: int) -> TRowsGenerator:
+        start, end = self._bounds(window)
+        key = _columns_getter(self.keys)
+        groups: dict[tuple[tp.Any, ...], list[TRow]] = {}
+        for row in rows:
+            groups.setdefault(key(row), []).append(row)
+        for group in groups.values():
+            for result in self.reducer(tuple(self.keys), group):
+                yield {**result, self.start_column: start, self.end_column: end}
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        buffer: deque[tuple[int, int, TRow]] = deque()  # (first window, last window, row)
+        window = 0
+
+        def close_window() -> TRowsGenerator:
+            nonlocal window
+            yield from self._reduce_window((row for _, _, row in takewhile(lambda item: item[0] <= window, buffer)),
+                                           window)
+            window += 1
+            while buffer and buffer[0][1] < window:
+                buffer.popleft()
+            if buffer:
+                window = max(window, buffer[0][0])
+
+        for row in rows:
+            first, last = self._windows(row[self.time_column])
+            if first > last:
+                continue  # between hopping windows
+            while buffer and window < first:
+                yield from close_window()
+            if not buffer:
+                window = first
+            buffer.append((first, last, row))
+
+        while buffer:
+            yield from close_window()
+
+
+class TumblingWindow(SlidingWindow):
+    """Reduce time-ordered table by consecutive non-overlapping windows [start, start + size)"""
+
+    def __init__(self, reducer: Reducer, time_column: str, size: float, keys: tp.Sequence[str] = (),
+                 start_column: str = 'window_start', end_column: str = 'window_end') -> None:
+        """
+        :param reducer: reducer to apply to rows of a window
+        :param time_column: name of numeric column rows are ordered by
+        :param size: length of window
+        :param keys: keys for grouping inside window, reducer gets all rows of the window if empty
+        :param start_column: name for result column with window start
+        :param end_column: name for result column with window end
+        """
+        super().__init__(reducer, time_column, size, size, keys, start_column, end_column)
+
+
+class Sort(Operation, Spillable):
+    """
+    Sort rows by keys in memory. On memory pressure rows collected so far are sorted and spilled
+    to disk as a run, runs are merged in the end
+    """
+
+    def __init__(self, keys: tp.Sequence[str]) -> None:
+        super().__init__()
+        self.keys = keys
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        key = _columns_getter(self.keys)
+        rows = iter(rows)
+        runs: list[_RowsBuffer] = []
+        run: list[TRow] = []
+        try:
+            while chunk := list(islice(rows, SPILL_CHUNK_SIZE)):
+                run.extend(chunk)
+                if self._take_memory_pressure():
+                    run.sort(key=key)
+                    runs.append(_RowsBuffer(run, max_rows_in_memory=0))
+                    run = []
+            run.sort(key=key)
+            # Merge is stable as well: ties are taken from earlier runs first
+            yield from heapq.merge(*runs, run, key=key) if runs else run
+        finally:
+            for spilled in runs:
+                spilled.close()
+
+
+def _reduce_partition(reducer: Reducer, keys: tp.Sequence[str], input_path: str, output_path: str) -> str:
+    rows = Reduce(reducer, keys)(Sort(keys)(ReadBinary(input_path)()))
+    for _ in WriteBinary(output_path)(rows):
+        pass
+    return output_path
+
+
+class PartitionedReduce(Operation):
+    """
+    Reduce executed by a pool of processes, input does not have to be sorted.
+    Rows are hash-partitioned by keys into files on disk, then every partition is sorted in memory
+    and reduced by a worker. Reducer and rows must be picklable
+    """
+
+    def __init__(self, reducer: Reducer, keys: tp.Sequence[str], partitions: int | None = None,
+                 workers: int | None = None, merge: bool = False, batch_size: int = 1024) -> None:
+        """
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        :param partitions: number of partitions, each one should fit in memory of a worker; workers by default
+        :param workers: number of worker processes, number of CPUs by default
+        :param merge: yield results sorted by keys (reducer output must contain them),
+                      otherwise partition results are concatenated
+        :param batch_size: number of rows buffered per partition before they are written
+        """
+        self.reducer = reducer
+        self.keys = keys
+        self.workers = workers or os.cpu_count() or 1
+        self.partitions = partitions or self.workers
+        self.merge = merge
+        self.batch_size = batch_size
+
+    def _split(self, rows: TRowsIterable, directory: Path) -> list[str]:
+        paths = [str(directory / f'input_{i}.bin') for i in range(self.partitions)]
+        key = _columns_getter(self.keys)
+        batches: list[list[TRow]] = [[] for _ in paths]
+        files = [open(path, 'wb') for path in paths]
+        try:
+            for f in files:
+                f.write(BINARY_MAGIC)
+            for row in rows:
+                partition = hash(key(row)) % self.partitions
+                batches[partition].append(row)
+                if len(batches[partition]) == self.batch_size:
+                    _write_frame(files[partition], batches[partition])
+                    batches[partition] = []
+            for f, batch in zip(files, batches):
+                if batch:
+                    _write_frame(f, batch)
+        finally:
+            for f in files:
+                f.close()
+        return paths
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        with tempfile.TemporaryDirectory() as directory:
+            inputs = self._split(rows, Path(directory))
+            outputs = [str(Path(directory) / f'output_{i}.bin') for i in range(self.partitions)]
+            with ProcessPoolExecutor(self.workers) as executor:
+                futures = [executor.submit(_reduce_partition, self.reducer, self.keys, input_path, output_path)
+                           for input_path, output_path in zip(inputs, outputs)]
+                for future in futures:
+                    future.result()
+
+            results = [ReadBinary(path)() for path in outputs]
+            if self.merge:
+                yield from heapq.merge(*results, key=_columns_getter(self.keys))
+            else:
+                for result in results:
+                    yield from result
+
+
+class _RowsBuffer:
+    """
+    Re-iterable storage of rows. First `max_rows_in_memory` rows are kept in memory,
+    the rest are spilled to a temporary file by chunks and replayed from it on every iteration.
+    If memory pressure is reported while rows are stored, rows kept so far and all further rows are spilled
+    """
+
+    def __init__(self, rows: TRowsIterable, max_rows_in_memory: int | None,
+                 memory_pressure: tp.Callable[[], bool] | None = None) -> None:
+        """
+        :param rows: rows to store
+        :param max_rows_in_memory: number of rows to keep in memory, None for no limit
+        :param memory_pressure: checked after every chunk of rows, spill everything once it returns True
+        """
+        rows = iter(rows)
+        self._rows: list[TRow] = []
+        self._size = 0
+        self._file: tp.IO[bytes] | None = None
+        spilling = max_rows_in_memory == 0
+
+        while chunk := list(islice(rows, SPILL_CHUNK_SIZE)):
+            self._size += len(chunk)
+            if not spilling:
+                room = len(chunk) if max_rows_in_memory is None else max_rows_in_memory - len(self._rows)
+                self._rows.extend(chunk[:room])
+                chunk = chunk[room:]
+                spilling = bool(chunk)
+                if not spilling and memory_pressure is not None and memory_pressure():
+                    spilling = True
+                    chunk, self._rows = self._rows, []
+            if chunk:
+                self._spill(chunk)
+        if self._file is not None:
+            self._file.flush()
+
+    def _spill(self, chunk: list[TRow]) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        pickle.dump(chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> tp.Iterator[TRow]:
+        yield from self._rows
+        position = 0
+        while self._file is not None:
+            self._file.seek(position)
+            try:
+                chunk = pickle.load(self._file)
+            except EOFError:
+                return
+            position = self._file.tell()
+            yield from chunk
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> '_RowsBuffer':
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        self.close()
+
+
+def _left_join(rows_a: TRowsIterable, rows_b: _RowsBuffer) -> TRowsGenerator:
     for row in rows_a:
         if len(rows_b) == 0:
             yield row
         for row_b in rows_b:
-            joined = row.copy()
-            joined.update(row_b)
-            yield joined
+            yield {**row, **row_b}
+
 
+def _columns_getter(columns: tp.Sequence[str]) -> tp.Callable[[TRow], tuple[tp.Any, ...]]:
+    """Make function extracting values of columns as a tuple (unlike plain itemgetter even for one column)"""
+    if len(columns) == 0:
+        return lambda row: ()
+    if len(columns) == 1:
+        column = columns[0]
+        return lambda row: (row[column],)
+    return operator.itemgetter(*columns)
 
-class Joiner(ABC):
-    """Base class for joiners"""
 
-    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2') -> None:
+class Joiner(ABC, Spillable):
+    """Base class for joiners. Buffered groups are spilled to disk on memory pressure"""
+
+    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2',
+                 max_rows_in_memory: int | None = JOIN_MAX_ROWS_IN_MEMORY) -> None:
+        """
+        :param suffix_a: suffix for left table columns with the same names as in right table
+        :param suffix_b: suffix for right table columns with the same names as in left table
+        :param max_rows_in_memory: number of rows of a buffered group to keep in memory,
+                                   the rest is spilled to disk; None to never spill
+        """
+        super().__init__()
         self._a_suffix = suffix_a
         self._b_suffix = suffix_b
+        self._max_rows_in_memory = max_rows_in_memory
+
+    def _buffer(self, rows: TRowsIterable) -> tp.ContextManager[_RowsBuffer]:
+        """Buffer group to iterate it several times, groups buffered by the caller are used as is and not closed"""
+        if isinstance(rows, _RowsBuffer):
+            return contextlib.nullcontext(rows)
+        return _RowsBuffer(rows, self._max_rows_in_memory, self._take_memory_pressure)
 
     @abstractmethod
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
@@ -144,6 +773,66 @@ class Join(Operation):
             b, g_b = next(groups_b, (empty, empty_iter))
 
 
+class HashJoin(Operation):
+    """
+    Join which does not require sorted tables: builds an in-memory index of the smaller table by join keys
+    and streams the other one. Build side is chosen by size hints (unknown size is considered infinite),
+    right table is indexed when sizes are equal or both unknown
+    """
+
+    def __init__(self, joiner: Joiner, keys: tp.Sequence[str],
+                 size_hint_a: int | None = None, size_hint_b: int | None = None) -> None:
+        """
+        :param joiner: joiner to combine rows with equal keys
+        :param keys: join keys
+        :param size_hint_a: expected number of rows in left table
+        :param size_hint_b: expected number of rows in right table
+        """
+        self.keys = keys
+        self.joiner = joiner
+        self.size_hint_a = size_hint_a
+        self.size_hint_b = size_hint_b
+
+    @staticmethod
+    def _size(rows: TRowsIterable, size_hint: int | None) -> float:
+        if size_hint is None:
+            size_hint = operator.length_hint(rows, -1)
+        return size_hint if size_hint >= 0 else float('inf')
+
+    def _key(self, row: TRow) -> tuple[tp.Any, ...]:
+        return tuple(row[key] for key in self.keys)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        build_a = self._size(rows, self.size_hint_a) < self._size(args[0], self.size_hint_b)
+        build_rows, probe_rows = (rows, args[0]) if build_a else (args[0], rows)
+
+        groups: dict[tuple[tp.Any, ...], list[TRow]] = defaultdict(list)
+        for row in build_rows:
+            groups[self._key(row)].append(row)
+        # Groups are passed to the joiner once per probe row, so they are buffered once and not copied by it
+        index = {key: _RowsBuffer(groups.pop(key), max_rows_in_memory=None) for key in list(groups)}
+
+        empty = _RowsBuffer((), max_rows_in_memory=None)
+        matched: set[tuple[tp.Any, ...]] = set()
+        for row in probe_rows:
+            key = self._key(row)
+            group = index.get(key, empty)
+            if group is not empty:
+                matched.add(key)
+            if build_a:
+                yield from self.joiner(self.keys, group, [row])
+            else:
+                yield from self.joiner(self.keys, [row], group)
+
+        for key, group in index.items():
+            if key in matched:
+                continue
+            if build_a:
+                yield from self.joiner(self.keys, group, empty)
+            else:
+                yield from self.joiner(self.keys, empty, group)
+
+
 # Dummy operators
 
 
@@ -170,6 +859,8 @@ class FirstReducer(Reducer):
 class FilterPunctuation(Mapper):
     """Left only non-punctuation symbols"""
 
+    _TABLE = str.maketrans('', '', string.punctuation)
+
     def __init__(self, column: str):
         """
         :param column: name of column to process
@@ -177,7 +868,7 @@ class FilterPunctuation(Mapper):
         self.column = column
 
     def __call__(self, row: TRow) -> TRowsGenerator:
-        row[self.column] = ''.join(char for char in row[self.column] if char not in string.punctuation)
+        row[self.column] = row[self.column].translate(self._TABLE)
         yield row
 
 
@@ -203,24 +894,38 @@ class LowerCase(Mapper):
 class Split(Mapper):
     """Split row on multiple rows by separator"""
 
+    # Longer values are split lazily, so that tokens are not materialized all at once
+    MAX_EAGER_SPLIT_LENGTH = 4096
+
     def __init__(self, column: str, separator: str | None = None) -> None:
         """
         :param column: name of column to split
-        :param separator: string to separate by
+        :param separator: string to separate by, every whitespace symbol if None
         """
         self.column = column
         self.separator = separator
+        self._separator_re = re.compile(r'\s' if separator is None else re.escape(separator))
+
+    def _tokens(self, text: str) -> tp.Iterator[str]:
+        if len(text) <= self.MAX_EAGER_SPLIT_LENGTH:
+            tokens = self._separator_re.split(text)
+            if tokens[-1] == '':
+                tokens.pop()
+            yield from tokens
+            return
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
         start = 0
-        col = row[self.column]
-        for i in range(len(col)):
-            if ((self.separator is not None and col[i] == self.separator) or
-                    (self.separator is None and col[i].isspace())):
-                yield {**row, self.column: col[start:i]}
-                start = i + 1
-        if start != len(col):
-            yield {**row, self.column: col[start:]}
+        for match in self._separator_re.finditer(text):
+            yield text[start:match.start()]
+            start = match.end()
+        if start != len(text):
+            yield text[start:]
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        for token in self._tokens(row[self.column]):
+            result = row.copy()
+            result[self.column] = token
+            yield result
 
 
 class Product(Mapper):
@@ -277,39 +982,61 @@ class Project(Mapper):
 
 
 class TopN(Reducer):
-    """Calculate top N by value"""
+    """
+    Calculate top N by value. Keeps a min-heap of at most N rows, so memory is O(N) for any group size.
+    Ties are resolved in favour of earlier rows
+    """
 
-    def __init__(self, column: str, n: int) -> None:
+    def __init__(self, column: str | tp.Sequence[str], n: int, ordered: bool = False) -> None:
         """
-        :param column: column name to get top by
+        :param column: column name (or names to compare lexicographically) to get top by
         :param n: number of top values to extract
+        :param ordered: yield rows in descending order, otherwise order is unspecified
         """
-        self.column_max = column
+        self.columns = (column,) if isinstance(column, str) else tuple(column)
         self.n = n
+        self.ordered = ordered
+        self._key = _columns_getter(self.columns)
 
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        largest_n = heapq.nlargest(self.n, rows, key=lambda row: row[self.column_max])
-        for i in range(self.n):
-            yield largest_n[len(list(rows)) - (i + 1)]
+        if self.n <= 0:
+            return
+        # Row index breaks ties, so rows themselves are never compared
+        heap: list[tuple[tuple[tp.Any, ...], int, TRow]] = []
+        for i, row in enumerate(rows):
+            item = (self._key(row), -i, row)
+            if len(heap) < self.n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+        if self.ordered:
+            heap.sort(reverse=True)
+        for _, _, row in heap:
+            yield row
 
 
 class TermFrequency(Reducer):
     """Calculate frequency of values in column"""
 
-    def __init__(self, words_column: str, result_column: str = 'tf') -> None:
+    def __init__(self, words_column: str, result_column: str = 'tf', count_column: str | None = None) -> None:
         """
         :param words_column: name for column with words
         :param result_column: name for result column
+        :param count_column: name for column with number of occurrences of the word (e.g. from CountCombiner),
+                             every row is a single occurrence if None
         """
         self.words_column = words_column
         self.result_column = result_column
+        self.count_column = count_column
 
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         count = 0
         res: tp.Dict[str, int] = defaultdict(int)
         for row in rows:
-            res[row[self.words_column]] += 1
-            count += 1
+            occurrences = 1 if self.count_column is None else row[self.count_column]
+            res[row[self.words_column]] += occurrences
+            count += occurrences
 
         for w, r in res.items():
             yield {**{key: row[key] for key in group_key},
@@ -363,55 +1090,383 @@ class Sum(Reducer):
         yield {**{key: row[key] for key in row if key in group_key}, self.column: summ}
 
 
-# Joiners
+def _hash64(value: tp.Any) -> int:
+    """Well mixed 64-bit hash stable between processes (unlike builtin hash, identity for small ints)"""
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), 'little')
 
 
-class InnerJoiner(Joiner):
-    """Join with inner strategy"""
+class ApproxDistinctCount(Reducer):
+    """
+    Estimate number of distinct values in column with HyperLogLog.
+    Memory is 2 ** precision bytes per group, standard error is about 1.04 / sqrt(2 ** precision)
+    """
 
-    def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        b = list(rows_b)
-        for row_a in rows_a:
-            for row_b in b:
+    def __init__(self, column: str, result_column: str = 'distinct', precision: int = 12) -> None:
+        """
+        :param column: name of column to count distinct values in
+        :param result_column: name for result column
+        :param precision: number of hash bits used to choose a register, from 4 to 16
+        """
+        self.column = column
+        self.result_column = result_column
+        self.precision = precision
 
-                inner_keys = row_a.keys() & row_b.keys()
-                joined: tp.Dict[str, tp.Any] = {}
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
+        registers_count = 1 << self.precision
+        rank_bits = 64 - self.precision
+        registers = bytearray(registers_count)
+        for row in rows:
+            value_hash = _hash64(row[self.column])
+            index = value_hash & (registers_count - 1)
+            rank = rank_bits - (value_hash >> self.precision).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
 
-                for x in row_a.keys() - inner_keys:
-                    joined[x] = row_a[x]
-                for x in keys:
-                    joined[x] = row_a[x]
+        alpha = 0.7213 / (1 + 1.079 / registers_count)
+        estimate = alpha * registers_count ** 2 / sum(2. ** -rank for rank in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * registers_count and zeros:
+            estimate = registers_count * math.log(registers_count / zeros)
+        yield {**{key: row[key] for key in group_key}, self.result_column: round(estimate)}
 
-                for x in row_b.keys() - inner_keys:
-                    joined[x] = row_b[x]
-                for x in inner_keys - set(keys):
-                    joined[x + self._a_suffix] = row_a[x]
-                    joined[x + self._b_suffix] = row_b[x]
 
-                yield joined
+class HeavyHitters(Reducer):
+    """
+    Find k most frequent values in column with Count-Min sketch.
+    Memory is width * depth counters plus k candidates per group, counts may be overestimated
+    """
+
+    def __init__(self, column: str, k: int, result_column: str = 'count', width: int = 2048, depth: int = 4) -> None:
+        """
+        :param column: name of column to find frequent values in
+        :param k: number of values to yield
+        :param result_column: name for column with estimated count
+        :param width: number of counters in a row of the sketch
+        :param depth: number of rows of the sketch
+        """
+        self.column = column
+        self.k = k
+        self.result_column = result_column
+        self.width = width
+        self.depth = depth
+
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
+        sketch = [[0] * self.width for _ in range(self.depth)]
+        candidates: dict[tp.Any, int] = {}
+        min_candidate = 0  # lower bound of the smallest candidate count, counts only grow
+        for row in rows:
+            value = row[self.column]
+            value_hash = _hash64(value)
+            first, second = value_hash & 0xFFFFFFFF, value_hash >> 32
+            estimate = None
+            for i, counters in enumerate(sketch):
+                index = (first + i * second) % self.width
+                counters[index] += 1
+                if estimate is None or counters[index] < estimate:
+                    estimate = counters[index]
+            assert estimate is not None
+
+            if value in candidates or len(candidates) < self.k:
+                candidates[value] = estimate
+            elif estimate > min_candidate:
+                weakest = min(candidates, key=candidates.__getitem__)
+                min_candidate = candidates[weakest]
+                if estimate > min_candidate:
+                    del candidates[weakest]
+                    candidates[value] = estimate
+
+        for value, count in sorted(candidates.items(), key=lambda item: item[1], reverse=True):
+            yield {**{key: row[key] for key in group_key}, self.column: value, self.result_column: count}
+
+
+def _compress_centroids(centroids: list[tuple[float, int]], compression: int) -> list[tuple[float, int]]:
+    """Merge adjacent centroids while they fit t-digest size bound given by arcsine scale function"""
+    centroids.sort()
+    total = sum(weight for _, weight in centroids)
+
+    def scale(q: float) -> float:
+        return compression / (2 * math.pi) * math.asin(2 * min(q, 1.) - 1)
+
+    result: list[tuple[float, int]] = []
+    mean, weight = centroids[0]
+    cumulative = 0
+    limit = scale(0.) + 1
+    for next_mean, next_weight in centroids[1:]:
+        if scale((cumulative + weight + next_weight) / total) <= limit:
+            weight += next_weight
+            mean += (next_mean - mean) * next_weight / weight
+            continue
+        result.append((mean, weight))
+        cumulative += weight
+        limit = scale(cumulative / total) + 1
+        mean, weight = next_mean, next_weight
+    result.append((mean, weight))
+    return result
+
+
+class ApproxQuantiles(Reducer):
+    """
+    Estimate quantiles of numeric column with t-digest.
+    Memory is O(compression) centroids per group, error is smallest for extreme quantiles
+    """
+
+    def __init__(self, column: str, quantiles: tp.Mapping[str, float], compression: int = 100) -> None:
+        """
+        :param column: name of numeric column
+        :param quantiles: mapping of result column name to quantile, e.g. {'p50': 0.5, 'p99': 0.99}
+        :param compression: bigger values give more centroids and better accuracy
+        """
+        self.column = column
+        self.quantiles = quantiles
+        self.compression = compression
+
+    @staticmethod
+    def _quantile(centroids: list[tuple[float, int]], total: int, minimum: float, maximum: float,
+                  q: float) -> float:
+        target = q * total
+        previous_mean, previous_center = minimum, 0.
+        cumulative = 0
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                return previous_mean + (mean - previous_mean) * (target - previous_center) / (center - previous_center)
+            previous_mean, previous_center = mean, center
+            cumulative += weight
+        if total == previous_center:
+            return maximum
+        return previous_mean + (maximum - previous_mean) * (target - previous_center) / (total - previous_center)
+
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
+        buffer_size = 5 * self.compression
+        centroids: list[tuple[float, int]] = []
+        total = 0
+        minimum, maximum = math.inf, -math.inf
+        for row in rows:
+            value = row[self.column]
+            centroids.append((value, 1))
+            total += 1
+            minimum, maximum = min(minimum, value), max(maximum, value)
+            if len(centroids) >= buffer_size:
+                centroids = _compress_centroids(centroids, self.compression)
+
+        centroids = _compress_centroids(centroids, self.compression)
+        yield {**{key: row[key] for key in group_key},
+               **{name: self._quantile(centroids, total, minimum, maximum, q) for name, q in self.quantiles.items()}}
+
+
+# Combiners
+
+
+class CountCombiner(Combiner):
+    """
+    Count records by key partially, finish with Sum(column)
+    Example for group_key=('a',) and column='d'
+        {'a': 1, 'b': 5, 'c': 2}
+        {'a': 1, 'b': 6, 'c': 1}
+        =>
+        {'a': 1, 'd': 2}
+    """
+
+    def __init__(self, column: str) -> None:
+        """
+        :param column: name for result column
+        """
+        self.column = column
+
+    def __call__(self, group_key: tuple[str, ...], partial: TRow | None, row: TRow) -> TRow:
+        if partial is None:
+            return {**{key: row[key] for key in group_key}, self.column: 1}
+        partial[self.column] += 1
+        return partial
+
+
+class SumCombiner(Combiner):
+    """
+    Sum values by key partially, finish with Sum(column)
+    Example for key=('a',) and column='b'
+        {'a': 1, 'b': 2, 'c': 4}
+        {'a': 1, 'b': 3, 'c': 5}
+        =>
+        {'a': 1, 'b': 5}
+    """
+
+    def __init__(self, column: str) -> None:
+        """
+        :param column: name for sum column
+        """
+        self.column = column
+
+    def __call__(self, group_key: tuple[str, ...], partial: TRow | None, row: TRow) -> TRow:
+        if partial is None:
+            return {**{key: row[key] for key in group_key}, self.column: row[self.column]}
+        partial[self.column] += row[self.column]
+        return partial
+
+
+# Joiners
+
+
+class InnerJoiner(Joiner):
+    """
+    Join with inner strategy.
+    Column mapping is computed once and reused while joined rows have the same sets of columns
+    """
+
+    def _join_plan(self, keys: tp.Sequence[str], row_a: TRow, row_b: TRow) -> TJoinMapping:
+        """
+        :return: result column names and getters of corresponding values from left and right rows
+        """
+        only_a = [column for column in row_a if column not in row_b]
+        only_b = [column for column in row_b if column not in row_a]
+        common = [column for column in row_a if column in row_b and column not in keys]
+        names = (only_a + list(keys) + [column + self._a_suffix for column in common] +
+                 only_b + [column + self._b_suffix for column in common])
+        return tuple(names), _columns_getter(only_a + list(keys) + common), _columns_getter(only_b + common)
+
+    def _cached_plan(self, plan: TJoinPlan | None, keys: tp.Sequence[str], row_a: TRow, row_b: TRow) -> TJoinPlan:
+        """Reuse plan if it was made for rows with the same columns, otherwise make a new one"""
+        if plan is None or row_a.keys() != plan[0] or row_b.keys() != plan[1]:
+            plan = frozenset(row_a), frozenset(row_b), self._join_plan(keys, row_a, row_b)
+        return plan
+
+    def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
+        # Plan is local to the call, so that concurrent joins sharing the joiner do not overwrite it
+        plan: TJoinPlan | None = None
+        with self._buffer(rows_b) as b:
+            # Right rows are checked to have the same columns while they are joined with the first left row,
+            # if they do, the plan is checked once per following left row instead of once per pair
+            first_b: TRow | None = None
+            uniform_b: bool | None = None
+            for row_a in rows_a:
+                if uniform_b and first_b is not None:
+                    plan = self._cached_plan(plan, keys, row_a, first_b)
+                    names, get_a, get_b = plan[2]
+                    for row_b in b:
+                        yield dict(zip(names, get_a(row_a) + get_b(row_b)))
+                    continue
+                check = uniform_b is None
+                if check:
+                    uniform_b = True
+                for row_b in b:
+                    if check:
+                        if first_b is None:
+                            first_b = row_b
+                        elif uniform_b and row_b.keys() != first_b.keys():
+                            uniform_b = False
+                    plan = self._cached_plan(plan, keys, row_a, row_b)
+                    names, get_a, get_b = plan[2]
+                    yield dict(zip(names, get_a(row_a) + get_b(row_b)))
+                if first_b is None:
+                    return
 
 
 class OuterJoiner(Joiner):
     """Join with outer strategy"""
 
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        a = list(rows_a)
-        b = list(rows_b)
-        yield from _left_join(a, b)
-        if len(a) == 0:
-            for row in b:
-                yield row
+        with self._buffer(rows_b) as b:
+            a = iter(rows_a)
+            first_a = next(a, None)
+            if first_a is None:
+                yield from b
+            else:
+                yield from _left_join(chain((first_a,), a), b)
 
 
 class LeftJoiner(Joiner):
     """Join with left strategy"""
 
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        yield from _left_join(rows_a, list(rows_b))
+        with self._buffer(rows_b) as b:
+            yield from _left_join(rows_a, b)
 
 
 class RightJoiner(Joiner):
     """Join with right strategy"""
 
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        yield from _left_join(rows_b, list(rows_a))
+        with self._buffer(rows_a) as a:
+            yield from _left_join(rows_b, a)
+
+
+# Compact rows
+
+
+class _Missing:
+    """Value of a column absent from the row, so that it stays absent after unpacking"""
+
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+    def __reduce__(self) -> str:
+        return 'MISSING'  # the same singleton after pickling, e.g. by WriteBinary or worker processes
+
+
+MISSING = _Missing()
+
+
+class Schema:
+    """
+    Shared column index for compact rows: a record is a tuple of values in the order of schema columns.
+    Absent columns are packed as MISSING and are dropped by unpack
+    """
+
+    def __init__(self, columns: tp.Sequence[str]) -> None:
+        """
+        :param columns: names of columns
+        """
+        self.columns = tuple(columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+
+    def pack(self, row: TRow) -> TRecord:
+        return tuple(map(row.get, self.columns, repeat(MISSING)))
+
+    def unpack(self, record: TRecord) -> TRow:
+        return {column: value for column, value in zip(self.columns, record) if value is not MISSING}
+
+
+class Pack(Operation):
+    """Convert rows to compact records"""
+
+    def __init__(self, schema: Schema) -> None:
+        self.schema = schema
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRecordsGenerator:  # type: ignore
+        yield from map(self.schema.pack, rows)
+
+
+class Unpack(Operation):
+    """Convert compact records back to rows"""
+
+    def __init__(self, schema: Schema) -> None:
+        self.schema = schema
+
+    def __call__(self, records: TRecordsIterable,  # type: ignore
+                 *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        yield from map(self.schema.unpack, records)
+
+
+class Compact(Operation):
+    """
+    Adapter running any operation (Map, Reduce, Join, ...) over compact records. Records are unpacked
+    on the fly and results are packed back, so only rows being processed at the moment exist as dicts
+    """
+
+    def __init__(self, operation: Operation, schema: Schema, result_schema: Schema | None = None,
+                 join_schema: Schema | None = None) -> None:
+        """
+        :param operation: operation to run
+        :param schema: schema of input records
+        :param result_schema: schema of output records, same as input by default
+        :param join_schema: schema of records of the second table for join, same as input by default
+        """
+        self.operation = operation
+        self.schema = schema
+        self.result_schema = result_schema or schema
+        self.join_schema = join_schema or schema
+
+    def __call__(self, records: TRecordsIterable,  # type: ignore
+                 *args: tp.Any, **kwargs: tp.Any) -> TRecordsGenerator:
+        rows = map(self.schema.unpack, records)
+        other_rows = [map(self.join_schema.unpack, other) for other in args]
+        yield from map(self.result_schema.pack, self.operation(rows, *other_rows, **kwargs))
@@ -0,0 +1,115 @@
+import dataclasses
+import typing as tp
+from time import perf_counter
+
+from . import operations as ops
+from .memory_watchdog import SELF_PROCESS
+
+SAMPLE_EVERY = 1024  # rows between RSS samples
+
+
+@dataclasses.dataclass
+class StageStats:
+    """Statistics of one instrumented operation"""
+
+    name: str
+    rows_in: int = 0
+    rows_out: int = 0
+    wall_time: float = 0.  # time spent producing output rows, upstream stages included
+    upstream_time: float = 0.  # time spent waiting for input rows
+    start_rss: int = 0
+    peak_rss: int = 0
+
+    @property
+    def self_time(self) -> float:
+        """Time spent in the operation itself including its mapper, reducer or joiner"""
+        return self.wall_time - self.upstream_time
+
+    @property
+    def peak_rss_delta(self) -> int:
+        return max(0, self.peak_rss - self.start_rss)
+
+
+class PipelineReport:
+    """Collection of per-stage statistics of a pipeline run"""
+
+    def __init__(self) -> None:
+        self.stages: list[StageStats] = []
+
+    def add(self, name: str) -> StageStats:
+        stats = StageStats(name=f'{len(self.stages) + 1}. {name}')
+        self.stages.append(stats)
+        return stats
+
+    def format(self) -> str:
+        lines = [f'{"stage":<40}{"rows in":>12}{"rows out":>12}{"wall, s":>10}{"self, s":>10}{"peak RSS, KiB":>15}']
+        for stats in self.stages:
+            lines.append(f'{stats.name:<40}{stats.rows_in:>12}{stats.rows_out:>12}{stats.wall_time:>10.3f}'
+                         f'{stats.self_time:>10.3f}{stats.peak_rss_delta // 1024:>15}')
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.format()
+
+
+def describe(operation: ops.Operation) -> str:
+    """Human readable name of operation with its mapper, reducer or joiner"""
+    name = type(operation).__name__
+    for attribute in ('mapper', 'reducer', 'joiner', 'operation'):
+        if hasattr(operation, attribute):
+            return f'{name}({type(getattr(operation, attribute)).__name__})'
+    if isinstance(operation, ops.FusedMap):
+        return f'{name}({", ".join(type(mapper).__name__ for mapper in operation.mappers)})'
+    return name
+
+
+class Instrumented(ops.Operation):
+    """
+    Wrapper counting rows passed through operation and time spent in it.
+    RSS of the whole process is sampled every SAMPLE_EVERY input or output rows, so peak RSS delta is
+    the growth observed while the stage was active rather than memory owned by the stage
+    """
+
+    def __init__(self, operation: ops.Operation, stats: StageStats) -> None:
+        """
+        :param operation: operation to wrap
+        :param stats: statistics to update
+        """
+        self.operation = operation
+        self.stats = stats
+
+    def _count(self, rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        rows = iter(rows)
+        while True:
+            start = perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                self.stats.upstream_time += perf_counter() - start
+            self.stats.rows_in += 1
+            if self.stats.rows_in % SAMPLE_EVERY == 0:
+                self._sample_rss()
+            yield row
+
+    def _sample_rss(self) -> None:
+        self.stats.peak_rss = max(self.stats.peak_rss, SELF_PROCESS.memory_info().rss)
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        # Sources (Read, ReadIterFactory) get no positional arguments, other operations get tables only
+        self.stats.start_rss = self.stats.peak_rss = SELF_PROCESS.memory_info().rss
+        rows = iter(self.operation(*map(self._count, args), **kwargs))
+        while True:
+            start = perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            finally:
+                self.stats.wall_time += perf_counter() - start
+            self.stats.rows_out += 1
+            if self.stats.rows_out % SAMPLE_EVERY == 0:
+                self._sample_rss()
+            yield row
+        self._sample_rss()
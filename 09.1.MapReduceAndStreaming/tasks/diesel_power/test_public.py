@@ -1,13 +1,23 @@
+import asyncio
 import copy
 import dataclasses
+import gzip
+import json
+import pathlib
+import pickle
+import threading
 import time
+import tracemalloc
 import typing as tp
 
 import pytest
 from pytest import approx
 
 from . import operations as ops
+from . import benchmark
 from . import memory_watchdog
+from .graph import Graph
+from .profiling import PipelineReport
 
 
 KiB = 1024
@@ -193,6 +203,21 @@ def test_mapper(case: MapCase) -> None:
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
 
 
+@pytest.mark.parametrize('case', MAP_CASES)
+@pytest.mark.parametrize('ordered', [True, False])
+def test_parallel_map(case: MapCase, ordered: bool) -> None:
+    data = copy.deepcopy(case.data)
+    expected = list(ops.Map(case.mapper)(copy.deepcopy(case.data)))
+
+    result = ops.ParallelMap(case.mapper, workers=2, chunk_size=1, ordered=ordered)(iter(data))
+    assert isinstance(result, tp.Iterator)
+    if ordered:
+        assert list(result) == expected
+    else:
+        key_func = _Key(*case.cmp_keys)
+        assert sorted(result, key=key_func) == sorted(expected, key=key_func)
+
+
 @dataclasses.dataclass
 class ReduceCase:
     reducer: ops.Reducer
@@ -270,6 +295,28 @@ REDUCE_CASES = [
         reduce_data_items=(0, 1, 2, 3),
         reduce_ground_truth_items=(0, 1)
     ),
+    ReduceCase(
+        reducer=ops.TopN(column=('rank', 'score'), n=3, ordered=True),
+        reducer_keys=('match_id',),
+        data=[
+            {'match_id': 1, 'player_id': 1, 'rank': 5, 'score': 10},
+            {'match_id': 1, 'player_id': 2, 'rank': 5, 'score': 20},
+            {'match_id': 1, 'player_id': 3, 'rank': 3, 'score': 99},
+            {'match_id': 1, 'player_id': 4, 'rank': 1, 'score': 100},
+
+            {'match_id': 2, 'player_id': 5, 'rank': 9, 'score': 0},
+        ],
+        ground_truth=[
+            {'match_id': 1, 'player_id': 2, 'rank': 5, 'score': 20},
+            {'match_id': 1, 'player_id': 1, 'rank': 5, 'score': 10},
+            {'match_id': 1, 'player_id': 3, 'rank': 3, 'score': 99},
+
+            {'match_id': 2, 'player_id': 5, 'rank': 9, 'score': 0},
+        ],
+        cmp_keys=("match_id", "player_id", "rank", "score"),
+        reduce_data_items=(0, 1, 2, 3),
+        reduce_ground_truth_items=(0, 1, 2)
+    ),
     ReduceCase(
         reducer=ops.TermFrequency(words_column='text'),
         reducer_keys=('doc_id',),
@@ -368,8 +415,68 @@ REDUCE_CASES = [
         cmp_keys=('test_id', 'text'),
         reduce_data_items=(0, 1, 2, 3),
         reduce_ground_truth_items=(0,)
-    )
+    ),
+    ReduceCase(
+        reducer=ops.ApproxDistinctCount(column='user_id', result_column='users'),
+        reducer_keys=('page',),
+        data=[
+            {'page': 'a', 'user_id': 1},
+            {'page': 'a', 'user_id': 2},
+            {'page': 'a', 'user_id': 1},
+            {'page': 'a', 'user_id': 3},
+
+            {'page': 'b', 'user_id': 'x'},
+            {'page': 'b', 'user_id': 'x'}
+        ],
+        ground_truth=[
+            {'page': 'a', 'users': 3},
+            {'page': 'b', 'users': 1}
+        ],
+        cmp_keys=('page', 'users'),
+        reduce_data_items=(0, 1, 2, 3),
+        reduce_ground_truth_items=(0,)
+    ),
+    ReduceCase(
+        reducer=ops.HeavyHitters(column='word', k=2),
+        reducer_keys=('doc_id',),
+        data=[
+            {'doc_id': 1, 'word': 'little'},
+            {'doc_id': 1, 'word': 'hello'},
+            {'doc_id': 1, 'word': 'little'},
+            {'doc_id': 1, 'word': 'world'},
+            {'doc_id': 1, 'word': 'hello'},
+            {'doc_id': 1, 'word': 'little'},
+
+            {'doc_id': 2, 'word': 'world'}
+        ],
+        ground_truth=[
+            {'doc_id': 1, 'word': 'little', 'count': 3},
+            {'doc_id': 1, 'word': 'hello', 'count': 2},
+
+            {'doc_id': 2, 'word': 'world', 'count': 1}
+        ],
+        cmp_keys=('doc_id', 'word', 'count'),
+        reduce_data_items=(0, 1, 2, 3, 4, 5),
+        reduce_ground_truth_items=(0, 1)
+    ),
+    ReduceCase(
+        reducer=ops.ApproxQuantiles(column='latency', quantiles={'p0': 0., 'p50': 0.5, 'p100': 1.}),
+        reducer_keys=('host',),
+        data=[
+            {'host': 'a', 'latency': 3},
+            {'host': 'a', 'latency': 1},
+            {'host': 'a', 'latency': 2},
 
+            {'host': 'b', 'latency': 7.5}
+        ],
+        ground_truth=[
+            {'host': 'a', 'p0': approx(1), 'p50': approx(2), 'p100': approx(3)},
+            {'host': 'b', 'p0': approx(7.5), 'p50': approx(7.5), 'p100': approx(7.5)}
+        ],
+        cmp_keys=('host',),
+        reduce_data_items=(0, 1, 2),
+        reduce_ground_truth_items=(0,)
+    )
 ]
 
 
@@ -389,6 +496,150 @@ def test_reducer(case: ReduceCase) -> None:
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
 
 
+def test_approx_reducers_accuracy() -> None:
+    rows = [{'key': 1, 'value': (i * 7919) % 10007, 'word': i % 10 if i % 3 else 0} for i in range(100000)]
+
+    (distinct,) = ops.ApproxDistinctCount('value')(('key',), iter(rows))
+    assert distinct['distinct'] == approx(10007, rel=0.05)
+
+    hitters = list(ops.HeavyHitters('word', k=1)(('key',), iter(rows)))
+    assert hitters == [{'key': 1, 'word': 0, 'count': approx(100000 / 3 + 100000 * 2 / 30, rel=0.01)}]
+
+    (quantiles,) = ops.ApproxQuantiles('value', {'p50': 0.5, 'p99': 0.99})(('key',), iter(rows))
+    assert quantiles['p50'] == approx(5003, rel=0.02)
+    assert quantiles['p99'] == approx(9907, rel=0.01)
+
+
+def test_top_n_order() -> None:
+    rows = [{'value': value} for value in (3, 9, 1, 7, 5, 8)]
+    assert list(ops.TopN(column='value', n=4, ordered=True)((), iter(rows))) == [
+        {'value': 9}, {'value': 8}, {'value': 7}, {'value': 5}
+    ]
+
+
+@pytest.mark.parametrize('max_groups', [1, 2, 100])
+def test_combine_count(max_groups: int) -> None:
+    words = ['hello', 'little', 'world', 'my', 'little', 'hello', 'little', 'hell']
+    rows = [{'sentence_id': i, 'word': word} for i, word in enumerate(words)]
+
+    combined = ops.Combine(ops.CountCombiner('count'), ['word'], max_groups=max_groups)(iter(rows))
+    assert isinstance(combined, tp.Iterator)
+    result = ops.Reduce(ops.Sum('count'), ['word'])(ops.Sort(['word'])(combined))
+    assert list(result) == [
+        {'word': 'hell', 'count': 1},
+        {'word': 'hello', 'count': 2},
+        {'word': 'little', 'count': 3},
+        {'word': 'my', 'count': 1},
+        {'word': 'world', 'count': 1}
+    ]
+
+
+def test_combine_sum() -> None:
+    rows = [{'match_id': i % 2, 'player_id': i, 'score': i} for i in range(10)]
+    combined = ops.Combine(ops.SumCombiner('score'), ['match_id'], max_groups=1)(iter(rows))
+    result = ops.Reduce(ops.Sum('score'), ['match_id'])(ops.Sort(['match_id'])(combined))
+    assert list(result) == [{'match_id': 0, 'score': 20}, {'match_id': 1, 'score': 25}]
+
+
+def test_combine_term_frequency() -> None:
+    case = next(case for case in REDUCE_CASES if isinstance(case.reducer, ops.TermFrequency))
+    key_func = _Key(*case.cmp_keys)
+
+    combined = ops.Combine(ops.CountCombiner('count'), ['doc_id', 'text'])(iter(copy.deepcopy(case.data)))
+    result = ops.Reduce(ops.TermFrequency('text', count_column='count'), ['doc_id'])(
+        ops.Sort(['doc_id'])(combined))
+    assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+
+
+def test_memory_pressure_flushes_and_spills() -> None:
+    def under_pressure(rows: tp.Iterable[dict[str, tp.Any]], spillable: ops.Spillable,
+                       every: int) -> tp.Generator[dict[str, tp.Any], None, None]:
+        for i, row in enumerate(rows):
+            if i and i % every == 0:
+                spillable.on_memory_pressure()
+            yield row
+
+    rows = [{'key': (i * 7919) % 100, 'i': i} for i in range(5000)]
+    sort = ops.Sort(['key'])
+    assert list(sort(under_pressure(rows, sort, 1000))) == sorted(rows, key=lambda row: row['key'])
+
+    combine = ops.Combine(ops.CountCombiner('count'), ['key'])
+    combined = list(combine(under_pressure(rows, combine, 1000)))
+    assert len(combined) == 500
+    assert list(ops.Reduce(ops.Sum('count'), ['key'])(ops.Sort(['key'])(combined))) == [
+        {'key': key, 'count': 50} for key in range(100)
+    ]
+
+    joiner = ops.InnerJoiner()
+    left = [{'key': 0, 'a': i} for i in range(3)]
+    right = [{'key': 0, 'b': i} for i in range(3000)]
+    joined = ops.Join(joiner, ['key'])(iter(left), under_pressure(right, joiner, 2000))
+    assert list(joined) == [{'key': 0, 'a': a, 'b': b} for a in range(3) for b in range(3000)]
+
+
+def test_tumbling_window() -> None:
+    rows = [
+        {'ts': 0, 'host': 'a', 'latency': 10},
+        {'ts': 3, 'host': 'b', 'latency': 20},
+        {'ts': 9.5, 'host': 'a', 'latency': 30},
+        {'ts': 10, 'host': 'a', 'latency': 40},
+        {'ts': 35, 'host': 'b', 'latency': 50}
+    ]
+    result = ops.TumblingWindow(ops.Sum('latency'), 'ts', size=10, keys=['host'])(iter(rows))
+    assert isinstance(result, tp.Iterator)
+    assert list(result) == [
+        {'host': 'a', 'latency': 40, 'window_start': 0, 'window_end': 10},
+        {'host': 'b', 'latency': 20, 'window_start': 0, 'window_end': 10},
+        {'host': 'a', 'latency': 40, 'window_start': 10, 'window_end': 20},
+        {'host': 'b', 'latency': 50, 'window_start': 30, 'window_end': 40}
+    ]
+
+
+def test_sliding_window() -> None:
+    rows = [{'ts': ts} for ts in (1, 2, 4, 7, 20)]
+    result = ops.SlidingWindow(ops.Count('count'), 'ts', size=4, step=2)(iter(rows))
+    assert list(result) == [
+        {'count': 1, 'window_start': -2, 'window_end': 2},
+        {'count': 2, 'window_start': 0, 'window_end': 4},
+        {'count': 2, 'window_start': 2, 'window_end': 6},
+        {'count': 2, 'window_start': 4, 'window_end': 8},
+        {'count': 1, 'window_start': 6, 'window_end': 10},
+        {'count': 1, 'window_start': 18, 'window_end': 22},
+        {'count': 1, 'window_start': 20, 'window_end': 24}
+    ]
+
+
+def test_hopping_window_drops_rows_between_windows() -> None:
+    rows = [{'ts': ts} for ts in (0, 1, 3, 4, 5, 11, 16)]
+    result = ops.SlidingWindow(ops.Count('count'), 'ts', size=2, step=5)(iter(rows))
+    assert list(result) == [
+        {'count': 2, 'window_start': 0, 'window_end': 2},
+        {'count': 1, 'window_start': 5, 'window_end': 7},
+        {'count': 1, 'window_start': 10, 'window_end': 12},
+        {'count': 1, 'window_start': 15, 'window_end': 17}
+    ]
+
+
+def test_window_bounds_do_not_drift() -> None:
+    rows = [{'ts': i * 0.1} for i in range(100)]
+    result = list(ops.TumblingWindow(ops.Count('count'), 'ts', size=0.1)(iter(rows)))
+    assert result == [{'count': 1, 'window_start': i * 0.1, 'window_end': (i + 1) * 0.1} for i in range(100)]
+
+    result = list(ops.SlidingWindow(ops.Count('count'), 'ts', size=0.2, step=0.1)(iter(rows)))
+    assert [row['window_start'] for row in result] == [i * 0.1 for i in range(-1, 100)]
+    assert sum(row['count'] for row in result) == 200
+
+
+def test_window_emits_closed_windows() -> None:
+    def rows() -> tp.Generator[dict[str, tp.Any], None, None]:
+        yield {'ts': 1}
+        yield {'ts': 12}
+        raise AssertionError('window must be closed without reading further')
+
+    result = ops.TumblingWindow(ops.Count('count'), 'ts', size=10)(rows())
+    assert next(result) == {'count': 1, 'window_start': 0, 'window_end': 10}
+
+
 @dataclasses.dataclass
 class JoinCase:
     joiner: ops.Joiner
@@ -480,6 +731,66 @@ JOIN_CASES = [
         join_data_right_items=(0, 1),
         join_ground_truth_items=(0, 1, 2, 3)
     ),
+    JoinCase(
+        joiner=ops.InnerJoiner(max_rows_in_memory=1),
+        join_keys=('id',),
+        data_left=[
+            {'id': 1, 'x': 11},
+            {'id': 1, 'x': 12},
+            {'id': 2, 'x': 21},
+            {'id': 2, 'x': 22},
+        ],
+        data_right=[
+            {'id': 1, 'y': 101},
+            {'id': 1, 'y': 102},
+            {'id': 2, 'y': 201},
+            {'id': 2, 'y': 202},
+        ],
+        ground_truth=[
+            {'id': 1, 'x': 11, 'y': 101},
+            {'id': 1, 'x': 11, 'y': 102},
+            {'id': 1, 'x': 12, 'y': 101},
+            {'id': 1, 'x': 12, 'y': 102},
+            {'id': 2, 'x': 21, 'y': 201},
+            {'id': 2, 'x': 21, 'y': 202},
+            {'id': 2, 'x': 22, 'y': 201},
+            {'id': 2, 'x': 22, 'y': 202},
+        ],
+        cmp_keys=('id', 'x', 'y'),
+        join_data_left_items=(0, 1),
+        join_data_right_items=(0, 1),
+        join_ground_truth_items=(0, 1, 2, 3)
+    ),
+    JoinCase(
+        joiner=ops.OuterJoiner(max_rows_in_memory=0),
+        join_keys=('id',),
+        data_left=[
+            {'id': 1, 'x': 11},
+            {'id': 1, 'x': 12},
+            {'id': 2, 'x': 21},
+            {'id': 2, 'x': 22},
+        ],
+        data_right=[
+            {'id': 1, 'y': 101},
+            {'id': 1, 'y': 102},
+            {'id': 2, 'y': 201},
+            {'id': 2, 'y': 202},
+        ],
+        ground_truth=[
+            {'id': 1, 'x': 11, 'y': 101},
+            {'id': 1, 'x': 11, 'y': 102},
+            {'id': 1, 'x': 12, 'y': 101},
+            {'id': 1, 'x': 12, 'y': 102},
+            {'id': 2, 'x': 21, 'y': 201},
+            {'id': 2, 'x': 21, 'y': 202},
+            {'id': 2, 'x': 22, 'y': 201},
+            {'id': 2, 'x': 22, 'y': 202},
+        ],
+        cmp_keys=('id', 'x', 'y'),
+        join_data_left_items=(0, 1),
+        join_data_right_items=(0, 1),
+        join_ground_truth_items=(0, 1, 2, 3)
+    ),
     JoinCase(
         joiner=ops.OuterJoiner(),
         join_keys=('player_id',),
@@ -602,6 +913,309 @@ def test_joiner(case: JoinCase) -> None:
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
 
 
+@pytest.mark.parametrize('case', JOIN_CASES)
+@pytest.mark.parametrize('size_hint_a, size_hint_b', [(None, None), (1, None), (None, 1)])
+def test_hash_join(case: JoinCase, size_hint_a: int | None, size_hint_b: int | None) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    data_left = copy.deepcopy(case.data_left)
+    data_right = copy.deepcopy(case.data_right)
+    result = ops.HashJoin(case.joiner, case.join_keys, size_hint_a=size_hint_a, size_hint_b=size_hint_b)(
+        iter(reversed(data_left)), iter(reversed(data_right)))
+    assert isinstance(result, tp.Iterator)
+    assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+
+
+@pytest.mark.parametrize('joiner', [ops.InnerJoiner(max_rows_in_memory=1), ops.LeftJoiner(max_rows_in_memory=1),
+                                    ops.RightJoiner(max_rows_in_memory=1)])
+def test_hash_join_buffers_group_once(joiner: ops.Joiner, monkeypatch: pytest.MonkeyPatch) -> None:
+    spills = []
+    temporary_file = ops.tempfile.TemporaryFile
+    monkeypatch.setattr(ops.tempfile, 'TemporaryFile', lambda: spills.append(1) or temporary_file())
+
+    left = [{'key': 0, 'a': i} for i in range(100)]
+    right = [{'key': 0, 'b': i} for i in range(10)]
+    result = ops.HashJoin(joiner, ['key'], size_hint_a=len(left), size_hint_b=len(right))(iter(left), iter(right))
+    assert sum(1 for _ in result) == 1000
+    assert not spills
+
+
+def _write_shards(directory: pathlib.Path) -> tuple[list[str], list[ops.TRow]]:
+    rows = [{'shard': shard, 'line': line} for shard in range(3) for line in range(100)]
+    filenames = [str(directory / 'shard_0.txt'), str(directory / 'shard_1.gz'), str(directory / 'shard_2.gz')]
+    for shard, filename in enumerate(filenames):
+        with (gzip.open if filename.endswith('.gz') else open)(filename, 'wt') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows if row['shard'] == shard)
+    return filenames, rows
+
+
+@pytest.mark.parametrize('rows_a,rows_b,expected', [
+    ([{'id': 1}, {'id': 1, 'x': 5}], [{'id': 1, 'y': 2}],
+     [{'id': 1, 'y': 2}, {'id': 1, 'x': 5, 'y': 2}]),
+    ([{'id': 1, 'x': 5}, {'id': 1}], [{'id': 1, 'y': 2}],
+     [{'id': 1, 'x': 5, 'y': 2}, {'id': 1, 'y': 2}]),
+    ([{'id': 1, 'x': 5}], [{'id': 1, 'y': 2}, {'id': 1, 'x': 3}],
+     [{'id': 1, 'x': 5, 'y': 2}, {'id': 1, 'x_1': 5, 'x_2': 3}]),
+    ([{'id': 1, 'x': 5}, {'id': 1, 'x': 6}], [{'id': 1, 'y': 2}, {'id': 1, 'x': 3}],
+     [{'id': 1, 'x': 5, 'y': 2}, {'id': 1, 'x_1': 5, 'x_2': 3},
+      {'id': 1, 'x': 6, 'y': 2}, {'id': 1, 'x_1': 6, 'x_2': 3}]),
+])
+def test_inner_join_mixed_schema(rows_a: list[dict[str, tp.Any]], rows_b: list[dict[str, tp.Any]],
+                                 expected: list[dict[str, tp.Any]]) -> None:
+    joiner = ops.InnerJoiner()
+    for _ in range(2):  # column mapping cached by the first pass must not leak into the second one
+        assert list(ops.Join(joiner, ['id'])(iter(rows_a), iter(rows_b))) == expected
+
+
+def test_inner_joiner_shared_by_concurrent_joins() -> None:
+    joiner = ops.InnerJoiner()
+    first = ops.Join(joiner, ['id'])(iter([{'id': 1, 'x': i} for i in range(3)]), iter([{'id': 1, 'y': 0}]))
+    second = ops.Join(joiner, ['id'])(iter([{'id': 1, 'y': i} for i in range(3)]), iter([{'id': 1, 'x': 0}]))
+    assert list(zip(first, second)) == [({'id': 1, 'x': i, 'y': 0}, {'id': 1, 'x': 0, 'y': i}) for i in range(3)]
+
+
+def test_inner_joiner_reads_group_once_per_left_row(monkeypatch: pytest.MonkeyPatch) -> None:
+    passes = []
+    rows_buffer_iter = ops._RowsBuffer.__iter__
+    monkeypatch.setattr(ops._RowsBuffer, '__iter__', lambda self: passes.append(1) or rows_buffer_iter(self))
+
+    right = ops._RowsBuffer([{'id': 1, 'b': i} for i in range(10)], max_rows_in_memory=None)
+    result = ops.InnerJoiner()(['id'], iter([{'id': 1, 'a': i} for i in range(3)]), right)
+    assert sum(1 for _ in result) == 30
+    assert len(passes) == 3
+
+
+def test_async_read(tmp_path: pathlib.Path) -> None:
+    filenames, rows = _write_shards(tmp_path)
+
+    result = ops.AsyncRead(filenames, json.loads, batch_size=7, max_batches_in_flight=2, max_files_in_flight=2)()
+    assert isinstance(result, tp.Iterator)
+    result_rows = list(result)
+    assert sorted(result_rows, key=_Key('shard', 'line')) == sorted(rows, key=_Key('shard', 'line'))
+    for shard in range(3):
+        assert [row for row in result_rows if row['shard'] == shard] == [row for row in rows if row['shard'] == shard]
+
+    async def collect() -> list[ops.TRow]:
+        return [row async for batch in ops.AsyncRead(filenames, json.loads).batches() for row in batch]
+    assert sorted(asyncio.run(collect()), key=_Key('shard', 'line')) == sorted(rows, key=_Key('shard', 'line'))
+
+
+def test_async_read_errors(tmp_path: pathlib.Path) -> None:
+    filenames, _ = _write_shards(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        list(ops.AsyncRead(filenames + [str(tmp_path / 'missing.gz')], json.loads)())
+
+    result = ops.AsyncRead(filenames, json.loads, batch_size=1)()
+    assert next(result)['line'] == 0
+    result.close()
+
+
+def test_async_read_cancelled_while_opening(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    filenames, _ = _write_shards(tmp_path)
+    opening, release = threading.Event(), threading.Event()
+    opened: list[tp.TextIO] = []
+
+    def slow_open(filename: str) -> tp.TextIO:
+        opening.set()
+        release.wait(10)
+        opened.append(open(filename))
+        return opened[-1]
+    monkeypatch.setattr(ops, '_open_text', slow_open)
+
+    async def cancel_while_opening() -> None:
+        batches = ops.AsyncRead(filenames[:1], json.loads).batches()
+        task = asyncio.ensure_future(batches.__anext__())
+        while not opening.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(cancel_while_opening())
+
+    release.set()
+    for _ in range(1000):
+        if opened and opened[0].closed:
+            break
+        time.sleep(0.01)
+    assert len(opened) == 1 and opened[0].closed
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 1024])
+def test_binary_write_read(tmp_path: pathlib.Path, batch_size: int) -> None:
+    filename = str(tmp_path / 'rows.bin')
+    rows = [{'id': i, 'text': f'row {i}', 'value': i / 3, 'tags': ['a'] * i} for i in range(5)]
+
+    written = ops.WriteBinary(filename, batch_size=batch_size)(iter(copy.deepcopy(rows)))
+    assert isinstance(written, tp.Iterator)
+    assert list(ops.Map(ops.Project(['id']))(written)) == [{'id': i} for i in range(5)]
+
+    result = ops.ReadBinary(filename)()
+    assert isinstance(result, tp.Iterator)
+    assert list(result) == rows
+
+
+def test_binary_read_empty(tmp_path: pathlib.Path) -> None:
+    filename = str(tmp_path / 'rows.bin')
+    assert list(ops.WriteBinary(filename)(iter([]))) == []
+    assert list(ops.ReadBinary(filename)()) == []
+
+
+def test_compact_operations() -> None:
+    games = ops.Schema(['game_id', 'player_id', 'score'])
+    players = ops.Schema(['player_id', 'username'])
+    result = ops.Schema(['player_id', 'username', 'score'])
+
+    games_records = list(ops.Pack(games)(iter([
+        {'game_id': 1, 'player_id': 1, 'score': 17},
+        {'game_id': 2, 'player_id': 1, 'score': 22},
+        {'game_id': 3, 'player_id': 2, 'score': 41}
+    ])))
+    assert games_records == [(1, 1, 17), (2, 1, 22), (3, 2, 41)]
+    players_records = players.pack({'player_id': 1, 'username': 'XeroX'}), players.pack({'player_id': 2})
+    assert players_records[1] == (2, ops.MISSING)
+
+    joined = list(ops.Compact(ops.Join(ops.InnerJoiner(), ['player_id']), games, result, join_schema=players)(
+        iter(games_records), iter(players_records)))
+    assert list(ops.Unpack(result)(iter(joined))) == [
+        {'player_id': 1, 'username': 'XeroX', 'score': 17},
+        {'player_id': 1, 'username': 'XeroX', 'score': 22},
+        {'player_id': 2, 'score': 41}
+    ]
+
+    scores = ops.Compact(ops.Reduce(ops.Sum('score'), ['player_id']), result)(iter(joined))
+    assert list(ops.Unpack(result)(scores)) == [
+        {'player_id': 1, 'score': 39},
+        {'player_id': 2, 'score': 41}
+    ]
+
+
+def test_compact_missing_columns() -> None:
+    schema = ops.Schema(['id', 'text', 'a', 'b'])
+    records = list(ops.Pack(schema)(iter([{'id': 1, 'text': 'Hello', 'a': 2, 'b': 3}, {'id': 2, 'a': 5}])))
+    assert pickle.loads(pickle.dumps(records)) == records
+
+    lowered = ops.Compact(ops.Map(ops.LowerCase('text')), schema)(iter(records))
+    product = ops.Schema(['id', 'text', 'product'])
+    multiplied = ops.Compact(ops.Map(ops.Product(['a', 'b'], 'product')), schema, product)(lowered)
+    assert list(ops.Unpack(product)(multiplied)) == [
+        {'id': 1, 'text': 'hello', 'product': 6},
+        {'id': 2, 'product': 5}
+    ]
+
+
+@pytest.mark.parametrize('merge', [True, False])
+def test_partitioned_reduce(merge: bool) -> None:
+    words = ['hello', 'little', 'world', 'my', 'little', 'hello', 'little', 'hell']
+    rows = [{'sentence_id': i % 3, 'word': word} for i, word in enumerate(words * 100)]
+
+    result = ops.PartitionedReduce(ops.Count('count'), ['word'], partitions=3, workers=2, merge=merge)(iter(rows))
+    assert isinstance(result, tp.Iterator)
+    expected = [
+        {'word': 'hell', 'count': 100},
+        {'word': 'hello', 'count': 200},
+        {'word': 'little', 'count': 300},
+        {'word': 'my', 'count': 100},
+        {'word': 'world', 'count': 100}
+    ]
+    if merge:
+        assert list(result) == expected
+    else:
+        assert sorted(result, key=_Key('word')) == expected
+
+
+def test_reduce_multiple_keys() -> None:
+    rows = [{'a': 1, 'b': 1}, {'a': 1, 'b': 1}, {'a': 1, 'b': 2}, {'a': 2, 'b': 2}]
+    assert list(ops.Reduce(ops.Count('count'), ['a', 'b'])(iter(rows))) == [
+        {'a': 1, 'b': 1, 'count': 2},
+        {'a': 1, 'b': 2, 'count': 1},
+        {'a': 2, 'b': 2, 'count': 1}
+    ]
+
+
+def test_graph_word_count() -> None:
+    docs = [
+        {'doc_id': 1, 'text': 'hello, my little WORLD'},
+        {'doc_id': 2, 'text': 'Hello, my little little hell'}
+    ]
+    graph = Graph.from_iter('docs') \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text')) \
+        .map(ops.Split('text')) \
+        .sort(['text']) \
+        .map(ops.Filter(lambda row: row['text'] != 'my')) \
+        .reduce(ops.Count('count'), ['text']) \
+        .sort(['count', 'text'])
+
+    assert [type(operation) for operation in graph.plan()] == [ops.FusedMap, ops.Sort, ops.Reduce, ops.Sort]
+    assert list(graph.run(docs=lambda: copy.deepcopy(docs))) == [
+        {'count': 1, 'text': 'hell'},
+        {'count': 1, 'text': 'world'},
+        {'count': 2, 'text': 'hello'},
+        {'count': 3, 'text': 'little'}
+    ]
+
+
+def test_graph_join() -> None:
+    players = Graph.from_iter('players').sort(['player_id'])
+    games = Graph.from_iter('games').sort(['player_id'])
+    graph = games.join(ops.InnerJoiner(), players, ['player_id']).map(ops.Project(['game_id', 'username']))
+
+    result = graph.run(
+        players=lambda: iter([{'player_id': 2, 'username': 'jay'}, {'player_id': 1, 'username': 'XeroX'}]),
+        games=lambda: iter([{'game_id': 3, 'player_id': 1}, {'game_id': 4, 'player_id': 2}])
+    )
+    assert sorted(result, key=_Key('game_id')) == [
+        {'game_id': 3, 'username': 'XeroX'},
+        {'game_id': 4, 'username': 'jay'}
+    ]
+
+
+def test_graph_report() -> None:
+    graph = Graph.from_iter('docs').map(ops.Split('text')).map(ops.LowerCase('text')) \
+        .sort(['text']).reduce(ops.Count('count'), ['text'])
+
+    report = PipelineReport()
+    result = list(graph.run(report, docs=lambda: iter([{'text': 'a B b'}, {'text': 'c'}])))
+    assert len(result) == 3
+
+    assert [(stats.name, stats.rows_in, stats.rows_out) for stats in report.stages] == [
+        ('1. ReadIterFactory', 0, 2),
+        ('2. FusedMap(Split, LowerCase)', 2, 4),
+        ('3. Sort', 4, 4),
+        ('4. Reduce(Count)', 4, 3)
+    ]
+    assert all(stats.self_time >= 0 for stats in report.stages)
+    assert report.format().count('\n') == len(report.stages)
+
+
+def test_graph_run_with_watchdog() -> None:
+    players = Graph.from_iter('players').sort(['player_id'])
+    graph = Graph.from_iter('games').combine(ops.CountCombiner('count'), ['player_id']).sort(['player_id']) \
+        .join(ops.InnerJoiner(), players, ['player_id'])
+    sources = dict(
+        players=lambda: iter([{'player_id': 1, 'username': 'jay'}, {'player_id': 0, 'username': 'XeroX'}]),
+        games=lambda: iter([{'player_id': i % 2} for i in range(6)])
+    )
+    watchdog = memory_watchdog.MemoryWatchdog(limit=1, is_baseline=True, soft_limit=0.5)
+
+    for _ in range(2):
+        # Requests left from a previous run must not make combine flush partial aggregates at once
+        for operation in graph.plan():
+            for spillable in (operation, getattr(operation, 'joiner', None)):
+                if isinstance(spillable, ops.Spillable):
+                    spillable.on_memory_pressure()
+        result = iter(graph.run(watchdog=watchdog, **sources))
+        assert next(result) == {'player_id': 0, 'count': 3, 'username': 'XeroX'}
+        assert len(watchdog._callbacks) == 4  # combine, both sorts and joiner
+        assert list(result) == [{'player_id': 1, 'count': 3, 'username': 'jay'}]
+        assert watchdog._callbacks == []
+
+    result = iter(graph.run(watchdog=watchdog, **sources))
+    next(result)
+    result.close()  # type: ignore[attr-defined]
+    assert watchdog._callbacks == []
+
+
 # ########## HEAVY TESTS WITH MEMORY TRACKING ##########
 
 
@@ -621,6 +1235,47 @@ def _run_watchdog(callback: tp.Callable[[], tp.Any], limit: int, is_baseline: bo
     return thread.maximum_memory_usage
 
 
+def test_watchdog_history_and_spikes() -> None:
+    watchdog = memory_watchdog.MemoryWatchdog(limit=1, is_baseline=True, history_size=4,
+                                              snapshot_thresholds=[0.5, 2.])
+    watchdog.start()
+    try:
+        time.sleep(10 * memory_watchdog.SLEEP_PERIOD)
+    finally:
+        watchdog.stop()
+        watchdog.join()
+
+    samples = watchdog.samples()
+    assert len(samples) == 4
+    assert [t for t, _ in samples] == sorted(t for t, _ in samples)
+    assert max(usage for _, usage in samples) <= watchdog.maximum_memory_usage
+
+    report = watchdog.report()
+    assert report['samples_count'] > 4
+    assert [spike['threshold'] for spike in report['spikes']] == [0.5, 2.]
+    assert report['spikes'][0]['top']
+    assert json.loads(json.dumps(report))['maximum_memory_usage'] == watchdog.maximum_memory_usage
+
+
+def test_watchdog_memory_pressure() -> None:
+    combine = ops.Combine(ops.CountCombiner('count'), ['key'])
+    called = threading.Event()
+    watchdog = memory_watchdog.MemoryWatchdog(limit=2, is_baseline=True, soft_limit=0.5)
+    watchdog.register(combine.on_memory_pressure)
+    watchdog.register(called.set)
+    watchdog.start()
+    try:
+        assert called.wait(timeout=10)
+    finally:
+        watchdog.stop()
+        watchdog.join()
+    assert watchdog.report()['pressure_signals'] > 0
+
+    # Pending request flushes partial aggregates right after the first row
+    rows = [{'key': 'a'}, {'key': 'a'}]
+    assert list(combine(iter(rows))) == [{'key': 'a', 'count': 1}, {'key': 'a', 'count': 1}]
+
+
 def run_and_track_memory(callback: tp.Callable[[], tp.Any], limit: int) -> tp.Any:
     process_memory = _run_watchdog(callback, limit=limit, is_baseline=False)
     assert process_memory <= limit
@@ -654,6 +1309,20 @@ def test_heavy_split(baseline_memory: int) -> None:
     run_and_track_memory(lambda: next(op), baseline_memory + 500 * KiB)
 
 
+def test_heavy_fused_map() -> None:
+    graph = Graph.from_iter('input').map(ops.Split(column='data', separator='E')).map(ops.LowerCase(column='data'))
+    assert [type(operation) for operation in graph.plan()] == [ops.FusedMap]
+    rows = iter(graph.run(input=lambda: iter([{'data': 'E' * 100500, 'n': 2}])))
+
+    tracemalloc.start()
+    try:
+        next(rows)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak <= 500 * KiB
+
+
 def get_reduce_data() -> tp.Generator[dict[str, tp.Any], None, None]:
     for letter in ['a', 'b', 'c', 'ddd']:
         time.sleep(0.1)  # Some sleep for watchdog catch the memory change
@@ -676,7 +1345,10 @@ def test_heavy_reduce(func_reducer: ops.Reducer, additional_memory: int, baselin
 @pytest.mark.parametrize('func_joiner, additional_memory', [
     (ops.InnerJoiner(), 100 * MiB),
     (ops.LeftJoiner(), 100 * MiB),
-    (ops.RightJoiner(), 100 * MiB)
+    (ops.RightJoiner(), 100 * MiB),
+    (ops.InnerJoiner(max_rows_in_memory=1000), 10 * MiB),
+    (ops.LeftJoiner(max_rows_in_memory=1000), 10 * MiB),
+    (ops.RightJoiner(max_rows_in_memory=1000), 10 * MiB)
 ])
 def test_heavy_join(func_joiner: ops.Joiner, additional_memory: int, baseline_memory: int) -> None:
     op = ops.Join(func_joiner, ('key', ))(get_reduce_data(), get_reduce_data())
@@ -695,3 +1367,41 @@ def get_complexity_join_data() -> tp.Generator[dict[str, tp.Any], None, None]:
 ])
 def test_complexity_join(func_joiner: ops.Joiner) -> None:
     list(ops.Join(func_joiner, ('key', ))(get_complexity_join_data(), get_complexity_join_data()))
+
+
+def get_skewed_join_data() -> tp.Generator[dict[str, tp.Any], None, None]:
+    for n in range(1000):
+        yield {'key': 0, 'value': n}
+    for n in range(1, 100500):
+        yield {'key': n, 'value': n}
+
+
+@pytest.mark.parametrize('func_joiner', [
+    ops.InnerJoiner(),
+    ops.LeftJoiner(),
+    ops.RightJoiner()
+])
+def test_complexity_skewed_join(func_joiner: ops.Joiner) -> None:
+    start = time.perf_counter()
+    result = ops.Join(func_joiner, ('key', ))(get_skewed_join_data(), get_skewed_join_data())
+    assert sum(1 for _ in result) == 1000 * 1000 + 100499
+    # Hot key gives a million pairs, column mapping of every pair must not be recomputed
+    assert time.perf_counter() - start < 15
+
+
+def get_wide_data() -> tp.Generator[dict[str, tp.Any], None, None]:
+    for i in range(200000):
+        yield {'id': i, 'key': 'a', 'value': True, 'text': 'some text', 'flag': None}
+
+
+def test_heavy_compact(baseline_memory: int) -> None:
+    schema = ops.Schema(['id', 'key', 'value', 'text', 'flag'])
+    run_and_track_memory(lambda: list(ops.Pack(schema)(get_wide_data())), baseline_memory + 30 * MiB)
+
+
+@pytest.mark.parametrize('case', benchmark.CASES, ids=lambda case: case.name)
+def test_benchmark_cases(case: benchmark.Case) -> None:
+    result = benchmark.run_case(case, rows=500, trace_rows=200)
+    assert result.rows_in >= 500
+    assert result.rows_out > 0
+    assert result.name in benchmark.format_results([result])
@@ -0,0 +1,128 @@
+"""
+Lookup costs on a large synthetic database without secondary indexes and after `upgrade_schema`,
+and cost of settlement engines for trips of 10-10000 users.
+
+The database is built in database/benchmark.db, the main database is not touched. Usage:
+
+    python benchmark.py --users 20000 --trips 200 --events 100
+    python benchmark.py --settlement
+"""
+import argparse
+import random
+import time
+import typing as tp
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from splitvise.core import EventData, create_events_bulk, create_users_bulk, make_summary
+from splitvise.models import Debt, Event, Expense, Trip, User
+from splitvise.models.base import DATABASE_PATH, Base, set_sqlite_pragmas, upgrade_schema
+from splitvise.settlement import EXACT_MAX_USERS, SETTLEMENT_ENGINES
+
+BENCHMARK_DATABASE = DATABASE_PATH / 'benchmark.db'
+SEED = 42
+
+
+def build_database(users: int, trips: int, events_per_trip: int, trip_size: int) -> Engine:
+    for suffix in ('', '-wal', '-shm'):
+        BENCHMARK_DATABASE.with_name(BENCHMARK_DATABASE.name + suffix).unlink(missing_ok=True)
+    bind = create_engine(f'sqlite:///{BENCHMARK_DATABASE.as_posix()}', future=True)
+    event.listen(bind, 'connect', set_sqlite_pragmas)
+    Base.metadata.create_all(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(bind)
+
+    rng = random.Random(SEED)
+    with Session(bind, expire_on_commit=False) as session:
+        user_ids = [user.user_id for user in create_users_bulk([f'user{i}' for i in range(users)], session=session)]
+        for t in range(trips):
+            members = rng.sample(user_ids, trip_size)
+            trip = Trip(title=f'trip {t}', description='')
+            trip.users = [session.get(User, user_id) for user_id in members]
+            session.add(trip)
+            session.commit()
+            events = []
+            for e in range(events_per_trip):
+                payer, *debtors = rng.sample(members, 4)
+                debts = {debtor: Decimal(10) for debtor in debtors}
+                events.append(EventData(debts, {payer: Decimal(30)}, f'event {e}'))
+            create_events_bulk(trip.trip_id, events, session=session)
+    return bind
+
+
+def measure(bind: Engine, users: int, trips: int, events: int, lookups: int) -> dict[str, float]:
+    """Average milliseconds per operation, looked up users, trips and events are sampled from the whole database"""
+    rng = random.Random(SEED)
+    queries: dict[str, tp.Callable[[Session], tp.Any]] = {
+        'user by username': lambda session: session.scalars(
+            select(User).where(User.username == f'user{rng.randrange(users)}')).first(),
+        'events by trip': lambda session: session.scalars(
+            select(Event).where(Event.trip_id == rng.randrange(1, trips + 1))).all(),
+        'expenses by event': lambda session: session.scalars(
+            select(Expense).where(Expense.event_id == rng.randrange(1, events + 1))).all(),
+        'debts by event': lambda session: session.scalars(
+            select(Debt).where(Debt.event_id == rng.randrange(1, events + 1))).all(),
+    }
+    result = {}
+    with Session(bind, expire_on_commit=False) as session:
+        for name, query in queries.items():
+            start = time.perf_counter()
+            for _ in range(lookups):
+                query(session)
+            result[name] = (time.perf_counter() - start) * 1000 / lookups
+        start = time.perf_counter()
+        make_summary(rng.randrange(1, trips + 1), session=session)
+        result['make_summary'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def benchmark_settlement(sizes: tp.Sequence[int]) -> None:
+    rng = random.Random(SEED)
+    print(f'{"users":>8}' + ''.join(f'{name + ", ms":>14}{"transfers":>11}' for name in SETTLEMENT_ENGINES))
+    for size in sizes:
+        values = [Decimal(rng.randrange(-10000, 10000)) / 100 for _ in range(size - 1)]
+        balances = dict(enumerate(values + [-sum(values)]))
+        line = f'{size:>8}'
+        for engine in SETTLEMENT_ENGINES.values():
+            start = time.perf_counter()
+            transfers = engine(balances)
+            line += f'{(time.perf_counter() - start) * 1000:>14.2f}{len(transfers):>11}'
+        print(line)
+    print(f'exact engine falls back to heap for more than {EXACT_MAX_USERS} users')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--trips', type=int, default=200)
+    parser.add_argument('--events', type=int, default=100, help='events per trip')
+    parser.add_argument('--trip-size', type=int, default=10, help='users per trip')
+    parser.add_argument('--lookups', type=int, default=200, help='queries of every kind to average over')
+    parser.add_argument('--settlement', action='store_true', help='benchmark settlement engines only')
+    args = parser.parse_args()
+
+    if args.settlement:
+        benchmark_settlement([10, 15, 100, 1000, 10000])
+        return
+
+    start = time.perf_counter()
+    bind = build_database(args.users, args.trips, args.events, args.trip_size)
+    events = args.trips * args.events
+    print(f'built {events} events in {time.perf_counter() - start:.1f} s')
+    before = measure(bind, args.users, args.trips, events, args.lookups)
+    upgrade_schema(bind)
+    after = measure(bind, args.users, args.trips, events, args.lookups)
+
+    print(f'{"ms per operation":<20}{"no indexes":>12}{"indexed":>12}')
+    for name in before:
+        print(f'{name:<20}{before[name]:>12.3f}{after[name]:>12.3f}')
+    bind.dispose()
+    BENCHMARK_DATABASE.unlink()
+
+
+if __name__ == '__main__':
+    main()
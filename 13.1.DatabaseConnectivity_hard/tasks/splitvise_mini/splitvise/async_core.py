@@ -0,0 +1,107 @@
+"""
+Async variant of `core` for aiosqlite-backed sessions. Every function mirrors the function of `core`
+with the same name: database work runs in the connection thread of aiosqlite, so the event loop is not blocked
+"""
+import typing as tp
+
+from . import core
+from .core import EventData, MoneyType
+from .models import User, Trip, Event
+from .models.async_base import AsyncSession
+from .settlement import SettlementEngine
+
+T = tp.TypeVar('T')
+
+
+async def _run_sync(session: AsyncSession, function: tp.Callable[..., T], *args: tp.Any, **kwargs: tp.Any) -> T:
+    return await session.run_sync(lambda sync_session: function(*args, session=sync_session, **kwargs))
+
+
+async def create_user(
+        username: str,
+        *,
+        session: AsyncSession
+) -> User:
+    """See core.create_user"""
+    return await _run_sync(session, core.create_user, username)
+
+
+async def create_users_bulk(
+        usernames: tp.Sequence[str],
+        *,
+        session: AsyncSession
+) -> list[User]:
+    """See core.create_users_bulk"""
+    return await _run_sync(session, core.create_users_bulk, usernames)
+
+
+async def create_event(
+        trip_id: int,
+        people_debt: tp.Mapping[int, MoneyType],
+        people_payment: tp.Mapping[int, MoneyType],
+        title: str,
+        *,
+        session: AsyncSession
+) -> Event:
+    """See core.create_event"""
+    return await _run_sync(session, core.create_event, trip_id, people_debt, people_payment, title)
+
+
+async def create_events_bulk(
+        trip_id: int,
+        events: tp.Sequence[EventData],
+        *,
+        session: AsyncSession
+) -> list[Event]:
+    """See core.create_events_bulk"""
+    return await _run_sync(session, core.create_events_bulk, trip_id, events)
+
+
+async def rebuild_balances(
+        trip_id: int,
+        *,
+        session: AsyncSession
+) -> None:
+    """See core.rebuild_balances"""
+    return await _run_sync(session, core.rebuild_balances, trip_id)
+
+
+async def create_trip(
+        creator_id: int,
+        title: str,
+        description: str,
+        *,
+        session: AsyncSession
+) -> Trip:
+    """See core.create_trip"""
+    return await _run_sync(session, core.create_trip, creator_id, title, description)
+
+
+async def add_user_to_trip(
+        guest_id: int,
+        trip_id: int,
+        *,
+        session: AsyncSession
+) -> None:
+    """See core.add_user_to_trip"""
+    return await _run_sync(session, core.add_user_to_trip, guest_id, trip_id)
+
+
+async def get_trip_users(
+        trip_id: int,
+        *,
+        session: AsyncSession
+) -> list[User]:
+    """See core.get_trip_users"""
+    return await _run_sync(session, core.get_trip_users, trip_id)
+
+
+async def make_summary(
+        trip_id: int,
+        *,
+        session: AsyncSession,
+        verify: bool = False,
+        settle: str | SettlementEngine = 'greedy'
+) -> None:
+    """See core.make_summary"""
+    return await _run_sync(session, core.make_summary, trip_id, verify=verify, settle=settle)
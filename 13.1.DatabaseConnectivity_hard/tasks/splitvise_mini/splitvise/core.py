@@ -3,11 +3,23 @@ from collections import defaultdict
 from datetime import datetime
 from decimal import Decimal
 
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
 from .exceptions import SplitViseException
-from .models import User, Expense, Trip, Debt, Event, Summary
+from .models import User, Expense, Trip, Debt, Event, Summary, Balance
 from .models.base import Session
+from .settlement import SETTLEMENT_ENGINES, SettlementEngine
 
 MoneyType = Decimal
+IN_CLAUSE_CHUNK_SIZE = 500  # keep IN (...) below SQLite limit of bound parameters
+
+
+class EventData(tp.NamedTuple):
+    """Arguments of create_event for one event of create_events_bulk"""
+    people_debt: tp.Mapping[int, MoneyType]
+    people_payment: tp.Mapping[int, MoneyType]
+    title: str
 
 
 def create_user(
@@ -34,6 +46,37 @@ def create_user(
     return user
 
 
+def create_users_bulk(
+        usernames: tp.Sequence[str],
+        *,
+        session: Session
+) -> list[User]:
+    """
+    Create new Users in one transaction; validate all usernames before inserting any
+    :param usernames: usernames to create
+    :param session: active session to perform operations with
+    :return: list of orm User objects in order of usernames
+    :exception: usernames repeated, usernames already taken
+    """
+
+    if len(set(usernames)) != len(usernames):
+        raise SplitViseException("usernames repeated")
+
+    taken: set[str] = set()
+    for start in range(0, len(usernames), IN_CLAUSE_CHUNK_SIZE):
+        chunk = usernames[start:start + IN_CLAUSE_CHUNK_SIZE]
+        taken.update(session.scalars(select(User.username).where(User.username.in_(chunk))))
+    if taken:
+        raise SplitViseException(f"usernames already taken: {taken}")
+
+    users = [User(username=username) for username in usernames]
+
+    session.add_all(users)
+    session.commit()
+
+    return users
+
+
 def create_event(
         trip_id: int,
         people_debt: tp.Mapping[int, MoneyType],
@@ -54,37 +97,124 @@ def create_event(
                 Can not create payment for user not in trip, Sum of debts and sum of payments are not equal
     """
 
+    [event] = create_events_bulk(trip_id, [EventData(people_debt, people_payment, title)], session=session)
+    return event
+
+
+def create_events_bulk(
+        trip_id: int,
+        events: tp.Sequence[EventData],
+        *,
+        session: Session
+) -> list[Event]:
+    """
+    Create Events in one transaction, automatically creates Debts and Expenses and updates trip Balances;
+    validates all events before inserting any
+    :param trip_id: Trip.trip_id from the database
+    :param events: debts, payments and title of every event, see create_event
+    :param session: active session to perform operations with
+    :return: list of orm Event objects in order of events
+    :exception: Trip not found by id, Can not create debt for user not in trip,
+                Can not create payment for user not in trip, Sum of debts and sum of payments are not equal
+    """
+
     trip = session.get(Trip, trip_id)
 
     if not trip:
         raise SplitViseException("Trip not found by id")
 
     user_ids = set([user.user_id for user in trip.users])
-    missing_debt_users = set(people_debt.keys()) - user_ids
-    missing_payment_users = set(people_payment.keys()) - user_ids
-
-    if missing_debt_users:
-        raise SplitViseException(f"Can not create debt for users not in trip: {missing_debt_users}")
-    if missing_payment_users:
-        raise SplitViseException(f"Can not create payment for users not in trip: {missing_payment_users}")
-    if sum(people_debt.values()) != sum(people_payment.values()):
-        raise SplitViseException("Sum of debts and sum of payments are not equal")
-
-    event = Event(trip_id=trip_id, title=title, happened_datetime=datetime.now())
-    session.add(event)
+    for data in events:
+        missing_debt_users = data.people_debt.keys() - user_ids
+        missing_payment_users = data.people_payment.keys() - user_ids
+
+        if missing_debt_users:
+            raise SplitViseException(f"Can not create debt for users not in trip: {missing_debt_users}")
+        if missing_payment_users:
+            raise SplitViseException(f"Can not create payment for users not in trip: {missing_payment_users}")
+        if sum(data.people_debt.values()) != sum(data.people_payment.values()):
+            raise SplitViseException(f"Sum of debts and sum of payments are not equal in event {data.title!r}")
+
+    happened_datetime = datetime.now()
+    created = [Event(trip_id=trip_id, title=data.title, happened_datetime=happened_datetime, settled_up=False)
+               for data in events]
+    session.add_all(created)
+    # Flush only assigns event ids, expenses and debts are inserted in batches within the same transaction
+    session.flush()
+
+    expenses = [dict(event_id=event.event_id, payer_id=payer_id, value=pay_value)
+                for event, data in zip(created, events) for (payer_id, pay_value) in data.people_payment.items()]
+    debts = [dict(event_id=event.event_id, debtor_id=debtor_id, value=debt_value)
+             for event, data in zip(created, events) for (debtor_id, debt_value) in data.people_debt.items()]
+    if expenses:
+        session.execute(insert(Expense), expenses)
+    if debts:
+        session.execute(insert(Debt), debts)
+
+    balance_changes: dict[int, MoneyType] = defaultdict(MoneyType)
+    for data in events:
+        for (payer_id, pay_value) in data.people_payment.items():
+            balance_changes[payer_id] += pay_value
+        for (debtor_id, debt_value) in data.people_debt.items():
+            balance_changes[debtor_id] -= debt_value
+    _add_to_balances(trip_id, balance_changes, session=session)
     session.commit()
 
-    for (payer_id, pay_value) in people_payment.items():
-        payment = Expense(event_id=event.event_id, payer_id=payer_id, value=pay_value)
-        session.add(payment)
-        session.commit()
+    return created
 
-    for (debtor_id, debt_value) in people_debt.items():
-        debt = Debt(event_id=event.event_id, debtor_id=debtor_id, value=debt_value)
-        session.add(debt)
-        session.commit()
 
-    return event
+def _add_to_balances(trip_id: int, changes: tp.Mapping[int, MoneyType], *, session: Session) -> None:
+    """Add changes to kept Balances of the trip; sums are computed as Decimal, not by SQLite in floating point"""
+    if not changes:
+        return
+    current = dict(session.execute(select(Balance.user_id, Balance.value).where(Balance.trip_id == trip_id)).all())
+    upsert = sqlite_insert(Balance)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[Balance.trip_id, Balance.user_id],
+        set_={'value': upsert.excluded.value}
+    )
+    session.execute(upsert, [dict(trip_id=trip_id, user_id=user_id, value=current.get(user_id, 0) + value)
+                             for user_id, value in changes.items()])
+
+
+def _compute_balances(trip_id: int, *, session: Session) -> dict[int, MoneyType]:
+    """Balances of the trip aggregated from all its expenses and debts"""
+    balances: dict[int, MoneyType] = defaultdict(MoneyType)
+
+    # Rows are summed as Decimal here: SUM() of SQLite adds REAL values with float error
+    payments = (select(Expense.payer_id, Expense.value)
+                .join(Event, Event.event_id == Expense.event_id)
+                .where(Event.trip_id == trip_id))
+    debts = (select(Debt.debtor_id, Debt.value)
+             .join(Event, Event.event_id == Debt.event_id)
+             .where(Event.trip_id == trip_id))
+    for payer_id, pay_value in session.execute(payments):
+        balances[payer_id] += pay_value
+    for debtor_id, debt_value in session.execute(debts):
+        balances[debtor_id] -= debt_value
+
+    return balances
+
+
+def rebuild_balances(
+        trip_id: int,
+        *,
+        session: Session
+) -> None:
+    """
+    Recompute Balances of the trip from all its expenses and debts, e.g. for trips created before balances were kept
+    :param trip_id: Trip.trip_id from the database
+    :param session: active session to perform operations with
+    :return: None
+    :exception: Trip not found by id
+    """
+
+    if not session.get(Trip, trip_id):
+        raise SplitViseException("Trip does not exist")
+
+    session.execute(delete(Balance).where(Balance.trip_id == trip_id))
+    _add_to_balances(trip_id, _compute_balances(trip_id, session=session), session=session)
+    session.commit()
 
 
 def create_trip(
@@ -173,47 +303,48 @@ def get_trip_users(
 def make_summary(
         trip_id: int,
         *,
-        session: Session
+        session: Session,
+        verify: bool = False,
+        settle: str | SettlementEngine = 'greedy'
 ) -> None:
     """
     Make trip summary. Mark all the events of the trip as settled up. Validate at least the existence of the trip
-    being calculated
+    being calculated. Balances missing for a trip with events are aggregated from its expenses and debts
     :param trip_id: Trip.trip_id from the database
     :param session: active session to perform operations with
+    :param verify: check kept Balances against balances aggregated from all expenses and debts of the trip
+    :param settle: settlement engine or its name in settlement.SETTLEMENT_ENGINES: 'greedy', 'heap' or 'exact'
+                   (minimum number of transfers)
     :return: None
-    :exception: Trip not found by id
+    :exception: Trip not found by id, Balances do not match expenses and debts, Unknown settlement engine
     """
 
     if not session.get(Trip, trip_id):
         raise SplitViseException("Trip does not exist")
-
-    sum_stats: tp.Mapping[int, MoneyType] = defaultdict(MoneyType)
-
-    for event in session.query(Event).filter(Event.trip_id == trip_id).all():
-        event.settled_up = True
-        expenses = session.query(Expense).filter(Expense.event_id == event.event_id)
-        debts = session.query(Debt).filter(Debt.event_id == event.event_id)
-        for expense in expenses:
-            sum_stats[expense.payer_id] += expense.value
-        for debt in debts:
-            sum_stats[debt.debtor_id] -= debt.value
+    if isinstance(settle, str):
+        if settle not in SETTLEMENT_ENGINES:
+            raise SplitViseException(f"Unknown settlement engine: {settle}")
+        settle = SETTLEMENT_ENGINES[settle]
+
+    balances = session.execute(select(Balance.user_id, Balance.value).where(Balance.trip_id == trip_id))
+    sum_stats: tp.Mapping[int, MoneyType] = {user_id: value for user_id, value in balances}
+    if not sum_stats and session.scalar(select(exists().where(Event.trip_id == trip_id))):
+        # Trip created before balances were kept and not backfilled by upgrade_schema
+        sum_stats = _compute_balances(trip_id, session=session)
+        _add_to_balances(trip_id, sum_stats, session=session)
+
+    if verify:
+        computed = _compute_balances(trip_id, session=session)
+        if {k: v for k, v in sum_stats.items() if v != 0} != {k: v for k, v in computed.items() if v != 0}:
+            raise SplitViseException("Balances do not match expenses and debts, rebuild them")
 
     if sum(sum_stats.values()) != 0:
         raise SplitViseException("The summary does not add up")
 
-    total_stats: tp.List[tuple[MoneyType, int]] = [(user_sum[1], user_sum[0]) for user_sum in sum_stats.items() if
-                                                   user_sum[1] != 0]
-    total_stats.sort()
-
-    left = 0
-    right = len(total_stats) - 1
-    while left < right:
-        (debt_value, debtor_id) = total_stats[left]
-        (pay_value, payer_id) = total_stats[right]
-        transfer_sum = max(-pay_value, debt_value)
-        session.add(Summary(trip_id=trip_id, user_from_id=debtor_id, user_to_id=payer_id, value=transfer_sum))
-        if pay_value + transfer_sum == 0:
-            right -= 1
-        else:
-            left += 1
+    # Also marks Event objects already loaded into the session
+    session.execute(update(Event).where(Event.trip_id == trip_id).values(settled_up=True))
+
+    # Summary value is the change of balance of user_from, so it is negative
+    session.add_all([Summary(trip_id=trip_id, user_from_id=debtor_id, user_to_id=payer_id, value=-amount)
+                     for debtor_id, payer_id, amount in settle(sum_stats)])
     session.commit()
@@ -4,5 +4,6 @@ from .event import Event
 from .trip import Trip
 from .debt import Debt
 from .summary import Summary
+from .balance import Balance
 
-__all__ = ['User', 'Expense', 'Trip', 'Debt', 'Event', 'Summary']
+__all__ = ['User', 'Expense', 'Trip', 'Debt', 'Event', 'Summary', 'Balance']
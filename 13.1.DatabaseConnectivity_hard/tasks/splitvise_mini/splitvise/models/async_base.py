@@ -0,0 +1,12 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .base import DATABASE_PATH, set_sqlite_pragmas
+
+
+ASYNC_DATABASE_URL = f'sqlite+aiosqlite:///{DATABASE_PATH.as_posix()}/sqlite.db'
+
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+event.listen(async_engine.sync_engine, 'connect', set_sqlite_pragmas)
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
@@ -0,0 +1,31 @@
+import typing as tp
+from decimal import Decimal
+
+from sqlalchemy import Column, Integer, ForeignKey, VARCHAR
+from sqlalchemy.types import TypeDecorator
+
+from .base import Base
+
+
+class ExactDecimal(TypeDecorator):  # type: ignore
+    """Decimal kept as text: SQLite stores Numeric as REAL, so a running sum in it accumulates float error"""
+    impl = VARCHAR
+    cache_ok = True
+
+    def process_bind_param(self, value: Decimal | None, dialect: tp.Any) -> str | None:
+        return None if value is None else str(value)
+
+    def process_result_value(self, value: str | None, dialect: tp.Any) -> Decimal | None:
+        return None if value is None else Decimal(value)
+
+
+class Balance(Base):  # type: ignore
+    """Running sum of payments minus debts of the user over all events of the trip"""
+    __tablename__ = 'balances'
+
+    trip_id = Column(Integer, ForeignKey('trips.trip_id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+    value = Column(ExactDecimal)
+
+    def __repr__(self) -> str:
+        return f'<Balance trip_id={self.trip_id}, user_id={self.user_id}, value={self.value}>'
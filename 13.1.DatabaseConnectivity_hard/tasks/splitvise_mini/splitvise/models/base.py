@@ -1,17 +1,34 @@
+import typing as tp
+from collections import defaultdict
+from decimal import Decimal
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exists, insert, select
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 
 DATABASE_PATH = Path('database')
 DATABASE_PATH.mkdir(parents=True, exist_ok=True)
 DATABASE_URL = f'sqlite:///{DATABASE_PATH.as_posix()}/sqlite.db'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers do not block the writer
+    'synchronous': 'NORMAL',  # no fsync per transaction in WAL mode, still consistent after a crash
+    'cache_size': '-65536',  # negative value is in KiB, i.e. 64 MiB of page cache per connection
+}
+
+
+def set_sqlite_pragmas(dbapi_connection: tp.Any, connection_record: tp.Any) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
 
 
 engine = create_engine(
     DATABASE_URL, echo=False, future=True, connect_args={'check_same_thread': False}
 )
+event.listen(engine, 'connect', set_sqlite_pragmas)
 Session = sessionmaker(engine, future=True, expire_on_commit=False)
 
 
@@ -21,3 +38,42 @@ Base = declarative_base()
 def clear_database() -> None:
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+
+
+def upgrade_schema(bind: Engine = engine) -> None:
+    """
+    Bring existing database up to the models: create missing tables and missing indexes of existing ones.
+    Foreign keys of existing tables are not altered, SQLite can only change them by rebuilding the table.
+    Balances of trips created before they were kept are aggregated from their expenses and debts.
+    Fails on the unique index of users.username if the database already has duplicate usernames
+    """
+    Base.metadata.create_all(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+    _backfill_balances(bind)
+
+
+def _backfill_balances(bind: Engine) -> None:
+    """Aggregate balances of trips which have events but no balances, i.e. created before balances were kept"""
+    tables = Base.metadata.tables
+    events, expenses, debts, balances = (tables[name] for name in ('events', 'expenses', 'debts', 'balances'))
+
+    missing = select(events.c.trip_id).where(~exists().where(balances.c.trip_id == events.c.trip_id))
+    payments = (select(events.c.trip_id, expenses.c.payer_id, expenses.c.value)
+                .join(expenses, expenses.c.event_id == events.c.event_id)
+                .where(events.c.trip_id.in_(missing)))
+    owed = (select(events.c.trip_id, debts.c.debtor_id, debts.c.value)
+            .join(debts, debts.c.event_id == events.c.event_id)
+            .where(events.c.trip_id.in_(missing)))
+
+    # Summed as Decimal: SUM() of SQLite adds REAL values with float error
+    totals: dict[tuple[int, int], Decimal] = defaultdict(Decimal)
+    with bind.begin() as connection:
+        for trip_id, payer_id, pay_value in connection.execute(payments):
+            totals[trip_id, payer_id] += pay_value
+        for trip_id, debtor_id, debt_value in connection.execute(owed):
+            totals[trip_id, debtor_id] -= debt_value
+        if totals:
+            connection.execute(insert(balances), [dict(trip_id=trip_id, user_id=user_id, value=value)
+                                                  for (trip_id, user_id), value in totals.items()])
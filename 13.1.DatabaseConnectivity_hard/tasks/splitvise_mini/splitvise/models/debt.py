@@ -7,7 +7,7 @@ class Debt(Base):  # type: ignore
     __tablename__ = 'debts'
 
     debt_id = Column(Integer, primary_key=True)
-    event_id = Column(Integer, ForeignKey('events.event_id'))
+    event_id = Column(Integer, ForeignKey('events.event_id'), index=True)
     debtor_id = Column(Integer, ForeignKey('users.user_id'))
     value = Column(Numeric)
 
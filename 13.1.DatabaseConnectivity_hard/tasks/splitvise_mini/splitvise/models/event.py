@@ -7,7 +7,7 @@ class Event(Base):  # type: ignore
     __tablename__ = 'events'
 
     event_id = Column(Integer, primary_key=True)
-    trip_id = Column(Integer, ForeignKey('trips.trip_id'))
+    trip_id = Column(Integer, ForeignKey('trips.trip_id'), index=True)
     title = Column(VARCHAR)
     happened_datetime = Column(DateTime)
     settled_up = Column(Boolean)
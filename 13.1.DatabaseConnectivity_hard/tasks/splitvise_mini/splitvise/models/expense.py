@@ -7,7 +7,7 @@ class Expense(Base):  # type: ignore
     __tablename__ = 'expenses'
 
     expense_id = Column(Integer, primary_key=True)
-    event_id = Column(Integer, ForeignKey('trips.trip_id'))
+    event_id = Column(Integer, ForeignKey('events.event_id'), index=True)
     payer_id = Column(Integer, ForeignKey('users.user_id'))
     value = Column(Numeric)
 
@@ -9,7 +9,7 @@ class User(Base):  # type: ignore
     __tablename__ = 'users'
 
     user_id = Column(Integer, primary_key=True)
-    username = Column(String)
+    username = Column(String, unique=True, index=True)
 
     # Relations
     trips = relationship('Trip', secondary=UserTrip, back_populates='users')
@@ -0,0 +1,106 @@
+import heapq
+import typing as tp
+from decimal import Decimal
+
+MoneyType = Decimal
+EXACT_MAX_USERS = 15  # exact solver is O(2^n * n), larger groups are settled by heap engine
+
+
+class Transfer(tp.NamedTuple):
+    debtor_id: int
+    creditor_id: int
+    amount: MoneyType  # always positive
+
+
+SettlementEngine = tp.Callable[[tp.Mapping[int, MoneyType]], list[Transfer]]
+
+
+def settle_greedy(balances: tp.Mapping[int, MoneyType]) -> list[Transfer]:
+    """
+    Sort balances and match debtors from the largest debt with creditors from the largest credit
+    :param balances: mapping of User.user_id to payments minus debts, sums up to zero
+    :return: at most n - 1 transfers
+    """
+    stats = sorted((value, user_id) for user_id, value in balances.items() if value != 0)
+    transfers = []
+
+    left = 0
+    right = len(stats) - 1
+    while left < right:
+        (debt_value, debtor_id) = stats[left]
+        (pay_value, payer_id) = stats[right]
+        amount = min(-debt_value, pay_value)
+        transfers.append(Transfer(debtor_id, payer_id, amount))
+        stats[left] = (debt_value + amount, debtor_id)
+        stats[right] = (pay_value - amount, payer_id)
+        if stats[right][0] == 0:
+            right -= 1
+        if stats[left][0] == 0:
+            left += 1
+    return transfers
+
+
+def settle_heap(balances: tp.Mapping[int, MoneyType]) -> list[Transfer]:
+    """
+    Repeatedly match the largest remaining debt with the largest remaining credit, O(n log n)
+    :param balances: mapping of User.user_id to payments minus debts, sums up to zero
+    :return: at most n - 1 transfers
+    """
+    debtors = [(value, user_id) for user_id, value in balances.items() if value < 0]
+    creditors = [(-value, user_id) for user_id, value in balances.items() if value > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+    transfers = []
+
+    while debtors and creditors:
+        debt_value, debtor_id = heapq.heappop(debtors)
+        pay_value, payer_id = heapq.heappop(creditors)
+        amount = min(-debt_value, -pay_value)
+        transfers.append(Transfer(debtor_id, payer_id, amount))
+        if debt_value + amount != 0:
+            heapq.heappush(debtors, (debt_value + amount, debtor_id))
+        if pay_value + amount != 0:
+            heapq.heappush(creditors, (pay_value + amount, payer_id))
+    return transfers
+
+
+def settle_exact(balances: tp.Mapping[int, MoneyType]) -> list[Transfer]:
+    """
+    Minimum number of transfers: n minus the maximum number of disjoint zero-sum groups of users,
+    every group is settled separately. Found by dynamic programming over subsets, so groups
+    of more than EXACT_MAX_USERS users with non-zero balance are settled by settle_heap instead
+    :param balances: mapping of User.user_id to payments minus debts, sums up to zero
+    :return: minimum number of transfers
+    """
+    users = sorted(user_id for user_id, value in balances.items() if value != 0)
+    if len(users) > EXACT_MAX_USERS:
+        return settle_heap(balances)
+
+    full = (1 << len(users)) - 1
+    sums = [MoneyType(0)] * (full + 1)
+    groups = [0] * (full + 1)  # maximum number of zero-sum groups the subset splits into
+    for mask in range(1, full + 1):
+        lowest = (mask & -mask).bit_length() - 1
+        sums[mask] = sums[mask & (mask - 1)] + balances[users[lowest]]
+        best = max(groups[mask & ~(1 << i)] for i in range(len(users)) if mask >> i & 1)
+        groups[mask] = best + (sums[mask] == 0)
+
+    # Remove users one by one keeping the number of groups optimal, a group ends at every zero-sum subset
+    transfers = []
+    mask = full
+    group: dict[int, MoneyType] = {}
+    while mask:
+        i = max((i for i in range(len(users)) if mask >> i & 1), key=lambda i: groups[mask & ~(1 << i)])
+        group[users[i]] = balances[users[i]]
+        mask &= ~(1 << i)
+        if sums[mask] == 0:
+            transfers.extend(settle_greedy(group))
+            group = {}
+    return transfers
+
+
+SETTLEMENT_ENGINES: dict[str, SettlementEngine] = {
+    'greedy': settle_greedy,
+    'heap': settle_heap,
+    'exact': settle_exact,
+}
@@ -1,13 +1,20 @@
+import asyncio
+import random
 import typing as tp
+from collections import defaultdict
 from decimal import Decimal
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import select, update
 
-from splitvise.models.base import Session
-from splitvise.models import User
+from splitvise.models.base import Session, engine, upgrade_schema
+from splitvise.models.async_base import AsyncSession, async_engine
+from splitvise.models import Balance, Summary, User
 from splitvise.core import create_user, create_trip, add_user_to_trip, get_trip_users, create_event, make_summary
+from splitvise.core import EventData, create_events_bulk, create_users_bulk, rebuild_balances
+from splitvise import async_core
 from splitvise.exceptions import SplitViseException
+from splitvise.settlement import SETTLEMENT_ENGINES, settle_exact, settle_greedy, settle_heap
 
 
 def _make_money(dct: tp.Mapping[int, int | float]) -> dict[int, Decimal]:
@@ -28,6 +35,17 @@ def _count_rows_in_table(table_name: str) -> int:
         ''').fetchone()[0]
 
 
+def _cent_events(user_ids: tp.Sequence[int], count: int, seed: int = 42) -> list[EventData]:
+    """Events of a long trip: the first user pays an amount in cents, which is split between all users"""
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        cents = [rng.randrange(100000) for _ in user_ids]
+        debts = {user_id: Decimal(value).scaleb(-2) for user_id, value in zip(user_ids, cents)}
+        events.append(EventData(debts, {user_ids[0]: Decimal(sum(cents)).scaleb(-2)}, f'event {i}'))
+    return events
+
+
 DEFAULT_USERNAMES = ['a1', 'b2', 'c3', 'd4', 'e5']
 
 
@@ -215,8 +233,216 @@ class TestEvent:
         assert _count_rows_in_table('debts') == 0
 
 
+@pytest.mark.usefixtures('clear_session')
+class TestBulk:
+    def test_create_users_bulk(self, clear_session: Session) -> None:
+        usernames = [f'user{i}' for i in range(1000)]
+        users = create_users_bulk(usernames, session=clear_session)
+
+        assert [u.username for u in users] == usernames
+        assert len({u.user_id for u in users}) == len(usernames)
+        assert _count_rows_in_table('users') == len(usernames)
+
+        with pytest.raises(SplitViseException):
+            create_users_bulk(['new', 'user999'], session=clear_session)
+        with pytest.raises(SplitViseException):
+            create_users_bulk(['new', 'new'], session=clear_session)
+        assert _count_rows_in_table('users') == len(usernames)
+
+    def test_create_events_bulk(self, clear_session: Session) -> None:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=clear_session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=clear_session)
+
+        events_data = [
+            EventData(_make_money(_to_user_id({'a1': 30, 'b2': 70}, username_to_id)),
+                      _make_money(_to_user_id({'a1': 100}, username_to_id)), f'event {i}')
+            for i in range(100)
+        ]
+        events = create_events_bulk(trip.trip_id, events_data, session=clear_session)
+
+        assert [e.title for e in events] == [data.title for data in events_data]
+        assert _count_rows_in_table('events') == 100
+        assert _count_rows_in_table('expenses') == 100
+        assert _count_rows_in_table('debts') == 200
+
+    @pytest.mark.parametrize('payments,debts', [
+        ({'a1': 100}, {'c3': 100}),
+        ({'a1': 100}, {'b2': 200}),
+    ])
+    def test_create_events_bulk_invalid(self, payments: dict[str, float], debts: dict[str, float],
+                                        clear_session: Session) -> None:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=clear_session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=clear_session)
+
+        valid = EventData(_make_money(_to_user_id({'a1': 100}, username_to_id)),
+                          _make_money(_to_user_id({'b2': 100}, username_to_id)), 'valid')
+        invalid = EventData(_make_money(_to_user_id(debts, username_to_id)),
+                            _make_money(_to_user_id(payments, username_to_id)), 'invalid')
+        with pytest.raises(SplitViseException):
+            create_events_bulk(trip.trip_id, [valid, invalid], session=clear_session)
+
+        assert _count_rows_in_table('events') == 0
+        assert _count_rows_in_table('expenses') == 0
+        assert _count_rows_in_table('debts') == 0
+
+
+@pytest.mark.usefixtures('clear_session')
+class TestBalances:
+    def test_balances_follow_events(self, clear_session: Session) -> None:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=clear_session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=clear_session)
+        add_user_to_trip(username_to_id['c3'], trip.trip_id, session=clear_session)
+
+        for debts, payments in [({'a1': 60, 'b2': 30, 'c3': 10}, {'a1': 100}), ({'a1': 44, 'c3': 11}, {'b2': 55})]:
+            create_event(
+                trip.trip_id,
+                _make_money(_to_user_id(debts, username_to_id)),
+                _make_money(_to_user_id(payments, username_to_id)),
+                'event title',
+                session=clear_session
+            )
+
+        balances = clear_session.execute(select(Balance.user_id, Balance.value)).all()
+        assert dict(balances) == _to_user_id({'a1': -4, 'b2': 25, 'c3': -21}, username_to_id)
+
+        make_summary(trip.trip_id, session=clear_session, verify=True)
+
+    def test_verify_and_rebuild_balances(self, clear_session: Session) -> None:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=clear_session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=clear_session)
+        create_event(
+            trip.trip_id,
+            _make_money(_to_user_id({'b2': 100}, username_to_id)),
+            _make_money(_to_user_id({'a1': 100}, username_to_id)),
+            'event title',
+            session=clear_session
+        )
+
+        clear_session.execute(update(Balance).values(value=0))
+        clear_session.commit()
+        with pytest.raises(SplitViseException):
+            make_summary(trip.trip_id, session=clear_session, verify=True)
+
+        rebuild_balances(trip.trip_id, session=clear_session)
+        make_summary(trip.trip_id, session=clear_session, verify=True)
+        assert _count_rows_in_table('summaries') == 1
+
+    def test_long_trip_balances_are_exact(self, clear_session: Session) -> None:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=clear_session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=clear_session)
+        add_user_to_trip(username_to_id['c3'], trip.trip_id, session=clear_session)
+
+        events = _cent_events([username_to_id[username] for username in ('a1', 'b2', 'c3')], 3000)
+        for start in range(0, len(events), 10):
+            create_events_bulk(trip.trip_id, events[start:start + 10], session=clear_session)
+
+        expected: dict[int, Decimal] = defaultdict(Decimal)
+        for data in events:
+            for user_id, value in data.people_payment.items():
+                expected[user_id] += value
+            for user_id, value in data.people_debt.items():
+                expected[user_id] -= value
+        assert dict(clear_session.execute(select(Balance.user_id, Balance.value)).all()) == expected
+
+        make_summary(trip.trip_id, session=clear_session)
+        summaries = clear_session.execute(select(Summary.value)).scalars().all()
+        assert 0 < len(summaries) < 3
+
+    def _create_trip_before_balances(self, session: Session) -> tuple[int, dict[str | None, int]]:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=session)
+        add_user_to_trip(username_to_id['c3'], trip.trip_id, session=session)
+        create_event(
+            trip.trip_id,
+            _make_money(_to_user_id({'a1': 10, 'b2': 30, 'c3': 20}, username_to_id)),
+            _make_money(_to_user_id({'a1': 60}, username_to_id)),
+            'event title',
+            session=session
+        )
+        session.close()
+
+        # Database created before balances were kept has no balances table
+        Balance.__table__.drop(engine)
+        Balance.__table__.create(engine)
+        return trip.trip_id, username_to_id
+
+    def test_upgrade_schema_backfills_balances(self, clear_session: Session) -> None:
+        trip_id, username_to_id = self._create_trip_before_balances(clear_session)
+
+        upgrade_schema(engine)
+        upgrade_schema(engine)  # trips which already have balances are not touched
+        balances = clear_session.execute(select(Balance.user_id, Balance.value)).all()
+        assert dict(balances) == _to_user_id({'a1': 50, 'b2': -30, 'c3': -20}, username_to_id)
+
+        make_summary(trip_id, session=clear_session, verify=True)
+        assert _count_rows_in_table('summaries') == 2
+
+    def test_summary_rebuilds_missing_balances(self, clear_session: Session) -> None:
+        trip_id, username_to_id = self._create_trip_before_balances(clear_session)
+
+        make_summary(trip_id, session=clear_session, verify=True)
+        summaries = clear_session.execute(select(Summary.user_from_id, Summary.value)).all()
+        assert dict(summaries) == _to_user_id({'b2': -30, 'c3': -20}, username_to_id)
+
+
+class TestSettlement:
+    @pytest.mark.parametrize('engine', SETTLEMENT_ENGINES.values())
+    @pytest.mark.parametrize('balances', [
+        {1: -70, 2: -30, 3: 50, 4: 50},
+        {1: -9, 2: 7, 3: -2, 4: 5, 5: 6, 6: -7},
+        {1: 0, 2: 10, 3: -10},
+        {i: (i % 7 - 3) * 10 for i in range(1, 22)},
+    ])
+    def test_transfers_settle_balances(self, engine: tp.Callable[..., tp.Any], balances: dict[int, int]) -> None:
+        money = _make_money(balances)
+        remaining = dict(money)
+        transfers = engine(money)
+        for debtor_id, creditor_id, amount in transfers:
+            assert amount > 0
+            remaining[debtor_id] += amount
+            remaining[creditor_id] -= amount
+        assert all(value == 0 for value in remaining.values())
+        assert len(transfers) < len([value for value in balances.values() if value != 0])
+
+    def test_exact_is_minimal(self) -> None:
+        money = _make_money({1: -9, 2: 7, 3: -2, 4: 5, 5: 6, 6: -7})
+        assert len(settle_greedy(money)) == len(settle_heap(money)) == 5
+        # Zero-sum groups {7, -7} and {-9, -2, 5, 6} are settled separately
+        assert len(settle_exact(money)) == 4
+
+
 @pytest.mark.usefixtures('clear_session')
 class TestSummary:
+    def test_summary_of_many_fractional_events(self, clear_session: Session) -> None:
+        username_to_id = _create_default_users()
+
+        trip = create_trip(username_to_id['a1'], 'trip', 'description', session=clear_session)
+        add_user_to_trip(username_to_id['b2'], trip.trip_id, session=clear_session)
+        add_user_to_trip(username_to_id['c3'], trip.trip_id, session=clear_session)
+        user_ids = [username_to_id[username] for username in ('a1', 'b2', 'c3')]
+        events = _cent_events(user_ids, 3000)
+        create_events_bulk(trip.trip_id, events, session=clear_session)
+
+        # Balances aggregated from expenses and debts must match kept ones exactly
+        rebuild_balances(trip.trip_id, session=clear_session)
+        make_summary(trip.trip_id, session=clear_session, verify=True)
+
+        owed = {user_id: sum(data.people_debt[user_id] for data in events) for user_id in user_ids[1:]}
+        summaries = clear_session.execute(select(Summary.user_from_id, Summary.user_to_id, Summary.value)).all()
+        assert sorted(summaries) == [(user_id, user_ids[0], -value) for user_id, value in sorted(owed.items())]
+
     @pytest.mark.parametrize('debts,payments', [
         ({'a1': 100}, {'b2': 100}),
         ({'a1': 60, 'b2': 30, 'c3': 10}, {'a1': 100}),
@@ -250,8 +476,10 @@ class TestSummary:
         [({'a1': 100}, {'a1': 99, 'b2': 1}), ({'a1': 44, 'b2': 0.5, 'c3': 11}, {'a1': 55.5})],
         [({'a1': 100}, {'a1': 29.5, 'b2': 20.5, 'c3': 50}), ({'a1': 94.5, 'b2': 0.5, 'c3': 5}, {'a1': 100})],
     ])
+    @pytest.mark.parametrize('settle', SETTLEMENT_ENGINES)
     def test_create_summary_multiple_events(
-            self, clear_session: Session, debts_payments_pairs: list[tuple[dict[str, float], dict[str, float]]]
+            self, clear_session: Session, debts_payments_pairs: list[tuple[dict[str, float], dict[str, float]]],
+            settle: str
     ) -> None:
         username_to_id = _create_default_users()
 
@@ -271,7 +499,7 @@ class TestSummary:
                 session=clear_session
             )
 
-        make_summary(trip.trip_id, session=clear_session)
+        make_summary(trip.trip_id, session=clear_session, settle=settle)
 
         assert 0 < _count_rows_in_table('summaries') < len(usernames)
 
@@ -306,3 +534,38 @@ class TestSummary:
         ''').fetchall()
         for user_id, from_events, from_summary in summarised:
             assert from_events == from_summary, f'Incorrect sum for user {user_id}'
+
+
+@pytest.mark.usefixtures('clear_session')
+class TestAsync:
+    def test_async_core(self) -> None:
+        async def make_trip(session: tp.Any, creator_id: int, guest_ids: list[int]) -> int:
+            trip = await async_core.create_trip(creator_id, 'trip', 'description', session=session)
+            for guest_id in guest_ids:
+                await async_core.add_user_to_trip(guest_id, trip.trip_id, session=session)
+            events = [async_core.EventData({guest_id: Decimal(10) for guest_id in guest_ids},
+                                           {creator_id: Decimal(10 * len(guest_ids))}, f'event {i}') for i in range(3)]
+            await async_core.create_events_bulk(trip.trip_id, events, session=session)
+            await async_core.make_summary(trip.trip_id, session=session, verify=True)
+            return len(await async_core.get_trip_users(trip.trip_id, session=session))
+
+        async def scenario() -> list[int]:
+            try:
+                async with AsyncSession() as session:
+                    users = await async_core.create_users_bulk([f'user{i}' for i in range(6)], session=session)
+                    with pytest.raises(SplitViseException):
+                        await async_core.create_user('user0', session=session)
+                ids = [user.user_id for user in users]
+                sessions = [AsyncSession() for _ in range(2)]
+                try:
+                    return await asyncio.gather(make_trip(sessions[0], ids[0], ids[1:3]),
+                                                make_trip(sessions[1], ids[3], ids[4:]))
+                finally:
+                    for session in sessions:
+                        await session.close()
+            finally:
+                await async_engine.dispose()
+
+        assert asyncio.run(scenario()) == [3, 3]
+        assert _count_rows_in_table('events') == 6
+        assert _count_rows_in_table('summaries') == 4